@@ -0,0 +1,133 @@
+"""
+Buffered activity logging.
+
+Views call log() / log_many() to record ActivityLog events. Events are held
+in an in-process buffer and written with one bulk_create by a background
+thread once FLUSH_SIZE events are waiting or FLUSH_INTERVAL seconds have
+passed, so logging never adds an INSERT to the request. Events logged
+inside a transaction are only buffered once it commits.
+
+The buffer is per process and is lost if a worker is killed outright;
+activity history is best-effort and the attempt tables stay the source of
+truth. `manage.py rollup_activity` turns the log into ActivityDaily counts.
+"""
+import atexit
+import os
+import threading
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+
+from .models import ActivityLog, User
+
+DEFAULTS = {
+    'ENABLED': True,
+    'FLUSH_SIZE': 200,       # events that trigger an early flush
+    'FLUSH_INTERVAL': 5.0,   # seconds between periodic flushes
+    'MAX_BUFFER': 10000,     # oldest events are dropped past this (e.g. database down)
+}
+
+_buffer = []
+_lock = threading.Lock()
+_wake = threading.Event()
+_flusher = None
+_flusher_pid = None
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'ACTIVITY_LOG', {})}
+
+
+def log(user, activity_type, object_id=None, details=None):
+    """Record one event for user (a User or user id)."""
+    log_many(user, activity_type, [(object_id, details)])
+
+
+def log_many(user, activity_type, items):
+    """Record one event per (object_id, details) pair, all stamped now."""
+    if not get_config()['ENABLED']:
+        return
+    user_id = getattr(user, 'pk', user)
+    now = timezone.now()
+    events = [
+        ActivityLog(user_id=user_id, activity_type=activity_type, object_id=object_id, details=details, timestamp=now)
+        for object_id, details in items
+    ]
+    if events:
+        transaction.on_commit(lambda: _enqueue(events))
+
+
+def _enqueue(events):
+    config = get_config()
+    with _lock:
+        _buffer.extend(events)
+        dropped = len(_buffer) - config['MAX_BUFFER']
+        if dropped > 0:
+            del _buffer[:dropped]
+        full = len(_buffer) >= config['FLUSH_SIZE']
+    if dropped > 0:
+        print(f"Activity log buffer full; dropped {dropped} oldest events")
+    _ensure_flusher()
+    if full:
+        _wake.set()
+
+
+def _ensure_flusher():
+    """Start the flush thread in this process (again after a fork, whose child has no threads)."""
+    global _flusher, _flusher_pid
+    pid = os.getpid()
+    if _flusher is not None and _flusher_pid == pid and _flusher.is_alive():
+        return
+    with _lock:
+        if _flusher is not None and _flusher_pid == pid and _flusher.is_alive():
+            return
+        if _flusher_pid is None:
+            atexit.register(flush)
+        _flusher = threading.Thread(target=_run, name='activity-log-flusher', daemon=True)
+        _flusher_pid = pid
+        _flusher.start()
+
+
+def _run():
+    while True:
+        _wake.wait(get_config()['FLUSH_INTERVAL'])
+        _wake.clear()
+        try:
+            close_old_connections()
+            flush()
+        except Exception as e:
+            print(f"Activity log flush failed: {e}")
+
+
+def _requeue(events):
+    with _lock:
+        _buffer[:0] = events
+        dropped = len(_buffer) - get_config()['MAX_BUFFER']
+        if dropped > 0:
+            del _buffer[:dropped]
+
+
+def flush():
+    """Write every buffered event now. Returns the number written."""
+    with _lock:
+        events = _buffer[:]
+        _buffer.clear()
+    if not events:
+        return 0
+
+    batch_size = get_config()['FLUSH_SIZE']
+    try:
+        with transaction.atomic():
+            ActivityLog.objects.bulk_create(events, batch_size=batch_size)
+    except IntegrityError:
+        # Usually a user deleted since the event was logged; keep everyone else's.
+        existing = set(User.objects.filter(id__in={e.user_id for e in events}).values_list('id', flat=True))
+        events = [e for e in events if e.user_id in existing]
+        with transaction.atomic():
+            ActivityLog.objects.bulk_create(events, batch_size=batch_size)
+    except DatabaseError as e:
+        print(f"Activity log flush failed, keeping {len(events)} events for the next one: {e}")
+        _requeue(events)
+        return 0
+    return len(events)
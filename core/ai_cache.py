@@ -0,0 +1,159 @@
+"""
+Content-addressed cache for AI generation results.
+
+Results are keyed by a hash of everything that influences the model output
+(prompt template version, source content, temperature, variation, LLM
+backend and model), so the same request never pays for a second Gemini
+call while the entry is fresh, and switching LLM_BACKEND or LLM_MODEL
+never serves the previous backend's output.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+def make_cache_key(template_version, content, temperature=None, variation=None, backend=None):
+    payload = json.dumps(
+        [template_version, content, temperature, variation, backend],
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return "gen:" + hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LRUCacheBackend:
+    """In-process LRU with size- and age-based eviction."""
+
+    def __init__(self, max_entries=256, timeout=86400):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        expires_at = time.monotonic() + self.timeout if self.timeout else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class DjangoCacheBackend:
+    """Stores entries in a configured Django cache so all workers share them.
+
+    Size-based eviction is delegated to the cache's own MAX_ENTRIES option.
+    """
+
+    def __init__(self, alias="default", timeout=86400):
+        self.alias = alias
+        self.timeout = timeout
+
+    @property
+    def _cache(self):
+        return caches[self.alias]
+
+    def get(self, key):
+        return self._cache.get(key)
+
+    def set(self, key, value):
+        self._cache.set(key, value, self.timeout or None)
+
+    def delete(self, key):
+        self._cache.delete(key)
+
+    def clear(self):
+        self._cache.clear()
+
+
+class GenerationCache:
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        value = self.backend.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self.backend.set(key, value)
+
+    def delete(self, key):
+        self.backend.delete(key)
+
+    def clear(self):
+        self.backend.clear()
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": (hits / lookups) if lookups else 0,
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def build_generation_cache(config):
+    backend_name = config.get("BACKEND", "lru")
+    timeout = config.get("TIMEOUT", 86400)
+    if backend_name == "lru":
+        backend = LRUCacheBackend(max_entries=config.get("MAX_ENTRIES", 256), timeout=timeout)
+    elif backend_name == "django":
+        backend = DjangoCacheBackend(alias=config.get("ALIAS", "default"), timeout=timeout)
+    else:
+        raise ValueError(f"Unknown AI cache backend: {backend_name}")
+    return GenerationCache(backend)
+
+
+def get_generation_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = build_generation_cache(getattr(settings, "AI_CACHE", {}))
+    return _cache
@@ -0,0 +1,99 @@
+"""
+Helpers for generating from notes too long for a single prompt.
+
+Long note content is split into chunks that fit a token budget (map), and
+the items generated per chunk are merged and de-duplicated (reduce).
+"""
+import re
+
+# Rough English average; good enough for budgeting without a tokenizer.
+CHARS_PER_TOKEN = 4
+
+_PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def fits(text, max_tokens):
+    """Whether text fits one chunk; the same measure split_into_chunks packs to."""
+    return len(text) <= max_tokens * CHARS_PER_TOKEN
+
+
+def _split_oversized(paragraph, max_chars):
+    """Split one paragraph that is over budget by sentence, then hard-wrap."""
+    pieces = []
+    for sentence in _SENTENCE_END.split(paragraph):
+        while len(sentence) > max_chars:
+            pieces.append(sentence[:max_chars])
+            sentence = sentence[max_chars:]
+        if sentence:
+            pieces.append(sentence)
+    return pieces
+
+
+def split_into_chunks(text, max_tokens):
+    """
+    Pack paragraphs greedily into chunks of at most max_tokens (estimated).
+
+    Paragraph boundaries are kept where possible so each chunk reads as
+    coherent source material.
+    """
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    chunks = []
+    current = ''
+    for paragraph in _PARAGRAPH_BREAK.split(text.strip()):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        pieces = [paragraph] if len(paragraph) <= max_chars else _split_oversized(paragraph, max_chars)
+        for piece in pieces:
+            separator = '\n\n' if current else ''
+            if current and len(current) + len(separator) + len(piece) > max_chars:
+                chunks.append(current)
+                current = piece
+            else:
+                current += separator + piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def select_chunks(chunks, max_chunks):
+    """Pick at most max_chunks chunks spread evenly across the note."""
+    if len(chunks) <= max_chunks:
+        return chunks
+    step = len(chunks) / max_chunks
+    return [chunks[int(i * step)] for i in range(max_chunks)]
+
+
+def normalize_text(text):
+    return re.sub(r'[^a-z0-9]+', ' ', str(text).lower()).strip()
+
+
+def merge_unique(item_lists, count, key='question'):
+    """
+    Interleave per-chunk results round-robin, drop items whose `key` text
+    repeats an earlier one, and keep the first `count`.
+
+    Round-robin order means the kept items are spread across the chunks
+    instead of all coming from the start of the note.
+    """
+    merged = []
+    seen = set()
+    longest = max((len(items) for items in item_lists), default=0)
+    for position in range(longest):
+        for items in item_lists:
+            if position >= len(items):
+                continue
+            item = items[position]
+            fingerprint = normalize_text(item.get(key, ''))
+            if fingerprint in seen:
+                continue
+            seen.add(fingerprint)
+            merged.append(item)
+            if len(merged) == count:
+                return merged
+    return merged
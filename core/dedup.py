@@ -0,0 +1,116 @@
+"""
+Near-duplicate detection for generated questions and flashcards.
+
+Each note's existing question texts are fingerprinted with MinHash over
+word shingles and indexed with LSH banding, so a newly generated item is
+only compared against the few existing items that share a band with it.
+"""
+import hashlib
+import random
+
+from .chunking import normalize_text
+from .models import Flashcard, Question
+
+SHINGLE_SIZE = 3
+NUM_PERM = 64
+BANDS = 16  # 16 bands x 4 rows: pairs above ~0.5 similarity usually collide
+ROWS = NUM_PERM // BANDS
+SIMILARITY_THRESHOLD = 0.6
+HISTORY_LIMIT = 30  # prior questions summarized into the prompt
+SUMMARY_CHARS = 100
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20240719)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+
+def _shingle_hashes(text):
+    words = normalize_text(text).split()
+    if len(words) <= SHINGLE_SIZE:
+        grams = [' '.join(words)] if words else []
+    else:
+        grams = [' '.join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)]
+    return {
+        int.from_bytes(hashlib.blake2b(gram.encode('utf-8'), digest_size=8).digest(), 'big')
+        for gram in grams
+    }
+
+
+def signature(text):
+    hashes = _shingle_hashes(text)
+    if not hashes:
+        return None
+    return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS)
+
+
+def similarity(sig_a, sig_b):
+    """Estimated Jaccard similarity of the shingle sets behind two signatures."""
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / NUM_PERM
+
+
+class QuestionIndex:
+    def __init__(self, texts=(), threshold=SIMILARITY_THRESHOLD):
+        self.threshold = threshold
+        self.texts = []
+        self._signatures = []
+        self._buckets = {}
+        for text in texts:
+            self.add(text)
+
+    @classmethod
+    def for_note(cls, note, kind):
+        return cls.for_notes([note], kind)[note.id]
+
+    @classmethod
+    def for_notes(cls, notes, kind):
+        """Build one index per note from a single query. kind is 'quiz' or 'flashcards'."""
+        note_ids = [note.id for note in notes]
+        if kind == 'quiz':
+            rows = Question.objects.filter(quiz__note_id__in=note_ids).values_list('quiz__note_id', 'question')
+        else:
+            rows = Flashcard.objects.filter(note_id__in=note_ids).values_list('note_id', 'question')
+        indexes = {note_id: cls() for note_id in note_ids}
+        for note_id, text in rows.order_by('id'):
+            indexes[note_id].add(text)
+        return indexes
+
+    def _bands(self, sig):
+        return [(band, sig[band * ROWS:(band + 1) * ROWS]) for band in range(BANDS)]
+
+    def add(self, text):
+        sig = signature(text)
+        position = len(self.texts)
+        self.texts.append(text)
+        self._signatures.append(sig)
+        if sig is not None:
+            for band in self._bands(sig):
+                self._buckets.setdefault(band, []).append(position)
+
+    def is_duplicate(self, text):
+        sig = signature(text)
+        if sig is None:
+            return True  # blank question
+        candidates = set()
+        for band in self._bands(sig):
+            candidates.update(self._buckets.get(band, ()))
+        return any(similarity(sig, self._signatures[i]) >= self.threshold for i in candidates)
+
+    def filter_new(self, items, key='question'):
+        """
+        Return the items whose `key` text is not a near-duplicate of an
+        indexed text, adding each kept item so later items in the same batch
+        are checked against it too.
+        """
+        fresh = []
+        for item in items:
+            text = str(item.get(key, ''))
+            if self.is_duplicate(text):
+                continue
+            self.add(text)
+            fresh.append(item)
+        return fresh
+
+    def summary(self, limit=HISTORY_LIMIT):
+        """Most recent question texts, shortened for inclusion in a prompt."""
+        recent = self.texts[-limit:]
+        return [text if len(text) <= SUMMARY_CHARS else text[:SUMMARY_CHARS - 3] + '...' for text in recent]
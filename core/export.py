@@ -0,0 +1,169 @@
+"""
+Streaming exports of quiz and flashcard attempts as CSV or JSON Lines.
+
+Rows are read with .iterator(chunk_size=...) (a server-side cursor on
+PostgreSQL) and encoded one at a time, so memory stays flat however many
+attempts are exported. Rows are ordered by attempt id and every row starts
+with it: an interrupted export resumes by asking for ids after the last one
+received (`after_id`).
+"""
+import csv
+import json
+from datetime import datetime, time
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import (
+    Flashcard, FlashcardAttempt, GroupResource, Quiz, QuizAttempt, SharedFlashcard, SharedNote, SharedQuiz,
+)
+
+CHUNK_SIZE = 2000
+FORMATS = ('csv', 'jsonl')
+
+KINDS = {
+    'quiz': {
+        'model': QuizAttempt,
+        'item_model': Quiz,
+        'item_field': 'quiz_id',
+        'shared_model': SharedQuiz,
+        'time_field': 'attempted_at',
+        'fields': ['id', 'user_id', 'user__username', 'quiz_id', 'score', 'answers', 'attempted_at'],
+    },
+    'flashcard': {
+        'model': FlashcardAttempt,
+        'item_model': Flashcard,
+        'item_field': 'flashcard_id',
+        'shared_model': SharedFlashcard,
+        'time_field': 'reviewed_at',
+        'fields': ['id', 'user_id', 'user__username', 'flashcard_id', 'correct', 'reviewed_at'],
+    },
+}
+
+
+def parse_time(value):
+    """An ISO date (midnight) or datetime; naive values are in the default time zone."""
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"Invalid date or datetime: {value}")
+        moment = datetime.combine(day, time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def columns(kind):
+    """Output column names: field paths with the '__' joins flattened."""
+    return [field.replace('__', '_') for field in KINDS[kind]['fields']]
+
+
+def shared_with_group(kind, group_id):
+    """
+    Ids of the quizzes or flashcards shared with a group: directly, through a
+    shared note, or as a group resource.
+    """
+    spec = KINDS[kind]
+    shared_notes = SharedNote.objects.filter(group_id=group_id).values('note_id')
+    shared_notes_as_resources = GroupResource.objects.filter(group_id=group_id, resource_type='note').values('resource_id')
+    return spec['item_model'].objects.filter(
+        Q(id__in=spec['shared_model'].objects.filter(group_id=group_id).values(spec['item_field']))
+        | Q(id__in=GroupResource.objects.filter(group_id=group_id, resource_type=kind).values('resource_id'))
+        | Q(note_id__in=shared_notes)
+        | Q(note_id__in=shared_notes_as_resources)
+    ).values('id')
+
+
+def attempts(kind, user_ids=None, since=None, until=None, after_id=None, before_id=None, item_ids=None):
+    """
+    Attempts of one kind, oldest id first. user_ids and item_ids (quiz or
+    flashcard ids) are iterables or querysets of ids (None for all);
+    since/until bound the attempt time (inclusive/exclusive) and
+    after_id/before_id the id range (exclusive).
+    """
+    spec = KINDS[kind]
+    queryset = spec['model'].objects.all()
+    if user_ids is not None:
+        queryset = queryset.filter(user_id__in=user_ids)
+    if item_ids is not None:
+        queryset = queryset.filter(**{f"{spec['item_field']}__in": item_ids})
+    if since is not None:
+        queryset = queryset.filter(**{f"{spec['time_field']}__gte": since})
+    if until is not None:
+        queryset = queryset.filter(**{f"{spec['time_field']}__lt": until})
+    if after_id is not None:
+        queryset = queryset.filter(id__gt=after_id)
+    if before_id is not None:
+        queryset = queryset.filter(id__lt=before_id)
+    return queryset.order_by('id').values_list(*spec['fields'])
+
+
+class _Echo:
+    """File-like object whose write() returns the line for csv.writer to hand back."""
+
+    def write(self, value):
+        return value
+
+
+def _cell(value):
+    """Datetimes as full ISO 8601 (microseconds kept), so both formats agree on every timestamp."""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def csv_lines(kind, rows, header=True):
+    writer = csv.writer(_Echo())
+    if header:
+        yield writer.writerow(columns(kind))
+    for row in rows:
+        yield writer.writerow([json.dumps(value) if isinstance(value, (list, dict)) else _cell(value) for value in row])
+
+
+def jsonl_lines(kind, rows):
+    names = columns(kind)
+    for row in rows:
+        yield json.dumps({name: _cell(value) for name, value in zip(names, row)}, cls=DjangoJSONEncoder) + "\n"
+
+
+def stream(kind, fmt, queryset, header=True, chunk_size=CHUNK_SIZE):
+    """Encoded lines for every row of queryset, fetched chunk_size rows at a time."""
+    rows = queryset.iterator(chunk_size=chunk_size)
+    if fmt == 'csv':
+        return csv_lines(kind, rows, header)
+    return jsonl_lines(kind, rows)
+
+
+def resume_file(path, fmt):
+    """
+    Prepare an interrupted export file for appending: drop a final row cut
+    off mid-write and return the id of the last complete row (None if the
+    file is missing or holds no rows yet).
+    """
+    try:
+        f = open(path, 'rb+')
+    except FileNotFoundError:
+        return None
+    with f:
+        end = f.seek(0, 2)
+        # Rows never span lines (JSON values are escaped), and the last
+        # 64 KB always hold the last complete one.
+        start = f.seek(max(0, end - 65536))
+        tail = f.read()
+        complete = tail.rfind(b'\n') + 1
+        if start + complete < end and (complete or start == 0):
+            f.truncate(start + complete)
+        lines = tail[:complete].decode('utf-8', errors='ignore').splitlines()
+    for line in reversed(lines):
+        if not line.strip():
+            continue
+        try:
+            if fmt == 'csv':
+                return int(next(csv.reader([line]))[0])
+            return int(json.loads(line)['id'])
+        except (ValueError, KeyError, IndexError, StopIteration):
+            return None  # the CSV header: nothing exported yet
+    return None
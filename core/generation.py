@@ -0,0 +1,623 @@
+"""
+Prompt templates and Gemini calls shared by the AI generation endpoints and
+the background generation worker.
+"""
+import contextvars
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections, transaction
+
+from . import chunking, dedup, persistence, ratelimit
+from .ai_cache import get_generation_cache, make_cache_key
+from .llm import get_llm_backend
+from .models import Note
+
+# Bump a version whenever its prompt wording changes so results cached for
+# the old prompt stop being served.
+QUIZ_TEMPLATE_VERSION = 'quiz-v2'
+FLASHCARD_TEMPLATE_VERSION = 'flashcards-v2'
+NOTE_TEMPLATE_VERSION = 'note-v1'
+STUDY_SET_TEMPLATE_VERSION = 'study-set-v2'
+NOTE_STREAM_TEMPLATE_VERSION = 'note-stream-v1'
+
+
+# Generation rounds allowed to replace items dropped as near-duplicates.
+MAX_GENERATION_ROUNDS = 3
+
+
+class GenerationFormatError(ValueError):
+    """The model returned valid JSON that does not have the expected shape."""
+
+
+def _history_block(previous, label):
+    if not previous:
+        return ''
+    lines = '\n'.join(f'    - {text}' for text in previous)
+    return f"{label} already generated for this note (do NOT repeat or paraphrase any of these):\n{lines}\n"
+
+
+def build_quiz_prompt(content, variation=None, count=5, previous=None):
+    return f"""
+    Generate {count} unique multiple choice questions based on the following note:
+    \"\"\"{content}\"\"\"
+    {f'Variation: {variation}' if variation else ''}
+    {_history_block(previous, 'Questions')}
+
+    Respond ONLY with a valid JSON list of dictionaries formatted like this:
+    [
+      {{
+        "question": "...",
+        "options": ["A", "B", "C", "D"],
+        "correct": "B"
+      }},
+      ...
+    ]
+
+    But don't let the questions have their choices infront, like A) or B) or C) or D) just only the options.
+
+    If you have generated questions for this note before, do NOT repeat them. Make these questions as different as possible from previous ones.
+    """
+
+
+def build_flashcard_prompt(content, count=5, previous=None):
+    return f"""
+    Generate {count} flashcards based on the following note content:
+    \"\"\"{content}\"\"\"
+    {_history_block(previous, 'Flashcards')}
+
+    Respond ONLY with a valid JSON list of dictionaries formatted like this:
+    [
+      {{
+        "question": "What is...?",
+        "answer": "The answer is..."
+      }},
+      ...
+    ]
+
+    If you have generated questions for this note before, do NOT repeat them. Make these questions as different as possible from previous ones.
+    """
+
+
+def build_note_prompt(title, prompt):
+    return f"""
+Write a single, clear, and concise paragraph about the following topic for a student audience: '{title}'.
+{prompt}
+
+- Do not use headings, bullet points, or lists.
+- Respond ONLY with one well-written paragraph of plain text.
+- If you have generated notes for this notebook before, do NOT repeat them. Make these notes as different as possible from previous ones.
+
+Respond ONLY with a valid JSON object formatted like this:
+{{
+  "content": "generated content here"
+}}
+
+Do not include any other text, markdown, or explanation.
+"""
+
+
+def build_note_stream_prompt(title, prompt):
+    # Plain text rather than JSON so each streamed chunk can be shown as-is.
+    return f"""
+Write a single, clear, and concise paragraph about the following topic for a student audience: '{title}'.
+{prompt}
+
+- Do not use headings, bullet points, or lists.
+- Respond ONLY with one well-written paragraph of plain text.
+- If you have generated notes for this notebook before, do NOT repeat them. Make these notes as different as possible from previous ones.
+
+Do not include any other text, markdown, or explanation.
+"""
+
+
+def build_study_set_prompt(content, variation=None, count=5, previous_questions=None, previous_flashcards=None):
+    return f"""
+    Generate {count} unique multiple choice questions and {count} flashcards based on the following note:
+    \"\"\"{content}\"\"\"
+    {f'Variation: {variation}' if variation else ''}
+    {_history_block(previous_questions, 'Questions')}
+    {_history_block(previous_flashcards, 'Flashcards')}
+
+    Respond ONLY with a valid JSON object formatted like this:
+    {{
+      "questions": [
+        {{
+          "question": "...",
+          "options": ["A", "B", "C", "D"],
+          "correct": "B"
+        }},
+        ...
+      ],
+      "flashcards": [
+        {{
+          "question": "What is...?",
+          "answer": "The answer is..."
+        }},
+        ...
+      ]
+    }}
+
+    But don't let the questions have their choices infront, like A) or B) or C) or D) just only the options.
+
+    The flashcards should cover different facts from the multiple choice questions.
+    If you have generated questions for this note before, do NOT repeat them. Make these questions as different as possible from previous ones.
+    """
+
+
+def validate_quiz_items(quiz_data):
+    if not isinstance(quiz_data, list) or not all(
+        isinstance(q, dict) and
+        'question' in q and
+        'options' in q and
+        'correct' in q and
+        isinstance(q['options'], list)
+        for q in quiz_data
+    ):
+        raise GenerationFormatError("Invalid quiz format")
+    return quiz_data
+
+
+def validate_flashcard_items(flashcard_data):
+    if not isinstance(flashcard_data, list) or not all(
+        isinstance(fc, dict) and
+        'question' in fc and
+        'answer' in fc
+        for fc in flashcard_data
+    ):
+        raise GenerationFormatError("Invalid flashcard format")
+    return flashcard_data
+
+
+def parse_quiz_items(text):
+    return validate_quiz_items(json.loads(text))
+
+
+def parse_flashcard_items(text):
+    return validate_flashcard_items(json.loads(text))
+
+
+def parse_study_set(text):
+    data = json.loads(text)
+    if not isinstance(data, dict) or 'questions' not in data or 'flashcards' not in data:
+        raise GenerationFormatError("Invalid study set format")
+    return {
+        "questions": validate_quiz_items(data['questions']),
+        "flashcards": validate_flashcard_items(data['flashcards']),
+    }
+
+
+def parse_note_content(text):
+    text = text.strip()
+    try:
+        return json.loads(text)["content"]
+    except Exception:
+        return text  # fallback if not JSON
+
+
+def generate(prompt, *, template_version, content, parse, temperature=None, variation=None):
+    """
+    Run prompt through the configured LLM backend and return parse(response_text).
+
+    Parsed results are cached under a content hash; output that fails to
+    parse raises and is never cached.
+    """
+    cache = get_generation_cache()
+    key = make_cache_key(template_version, content, temperature, variation, get_llm_backend().cache_identity())
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    generation_config = {"response_mime_type": "application/json"}
+    if temperature is not None:
+        generation_config["temperature"] = temperature
+
+    def call():
+        with _call_slot():
+            print(f"Calling Gemini API with prompt length: {len(prompt)}")
+            return get_llm_backend().generate(prompt, generation_config)
+
+    text = ratelimit.guarded(call)
+    print(f"Received response from Gemini: {text[:200]}...")
+
+    result = parse(text)
+    cache.set(key, result)
+    return result
+
+
+def stream_note_text(title, prompt=''):
+    """
+    Yield the text of a generated note as Gemini produces it.
+
+    The full text is cached once the stream completes; a cache hit is
+    yielded as a single chunk.
+    """
+    cache = get_generation_cache()
+    key = make_cache_key(NOTE_STREAM_TEMPLATE_VERSION, [title, prompt], backend=get_llm_backend().cache_identity())
+    cached = cache.get(key)
+    if cached is not None:
+        yield cached
+        return
+
+    ratelimit.acquire()
+    parts = []
+    failed = False
+    try:
+        for text in get_llm_backend().stream(build_note_stream_prompt(title, prompt)):
+            parts.append(text)
+            yield text
+    except Exception:
+        failed = True
+        ratelimit.breaker().record_failure()
+        raise
+    finally:
+        # Also runs when the client disconnects mid-stream (GeneratorExit):
+        # upstream was answering, and a half-open trial slot must be freed.
+        if not failed:
+            ratelimit.breaker().record_success()
+    cache.set(key, ''.join(parts).strip())
+
+
+def is_configured():
+    return get_llm_backend().is_configured()
+
+
+def _needs_chunking(content):
+    return not chunking.fits(content, getattr(settings, 'GENERATION_CHUNK_TOKENS', 6000))
+
+
+def _chunks(content):
+    return chunking.select_chunks(
+        chunking.split_into_chunks(content, getattr(settings, 'GENERATION_CHUNK_TOKENS', 6000)),
+        getattr(settings, 'GENERATION_MAX_CHUNKS', 8),
+    )
+
+
+def estimated_calls(contents, kinds=1):
+    """LLM calls needed to generate `kinds` kinds of content from each text, before any top-up rounds."""
+    return kinds * sum(len(_chunks(content)) if _needs_chunking(content) else 1 for content in contents)
+
+
+def _generate_chunked(content, count, generate_chunk):
+    """
+    Map-reduce generation for long content: split it into chunks, call
+    generate_chunk(chunk, n) for each in parallel, and return the per-chunk
+    results. Chunks that fail are skipped unless all of them fail.
+    """
+    chunks = _chunks(content)
+    # Ask each chunk for a little more than its share to leave room for de-duplication.
+    per_chunk = -(-count // len(chunks)) + 1
+    with ratelimit.reserve(len(chunks)):
+        results = map_concurrently(lambda chunk: generate_chunk(chunk, per_chunk), chunks)
+    succeeded = [result for _, result, error in results if error is None]
+    limited = [error for _, _, error in results if isinstance(error, (ratelimit.RateLimitExceeded, ratelimit.CircuitOpenError))]
+    # Dropping chunks the limiter refused would quietly cover only part of the note.
+    if limited or not succeeded:
+        raise (limited or [results[0][2]])[0]
+    return succeeded
+
+
+def _content_key(content, previous, attempt):
+    # Retry rounds must not be answered from the cache entry of the round
+    # whose items were rejected as duplicates.
+    return [content, previous, attempt] if previous or attempt else content
+
+
+# The _*_items helpers make one Gemini call for content that fits a single
+# prompt; chunks are passed to them directly, never back through chunking.
+
+def _quiz_items(content, temperature, variation, count, previous, attempt):
+    return generate(
+        build_quiz_prompt(content, variation, count, previous),
+        template_version=f'{QUIZ_TEMPLATE_VERSION}:{count}',
+        content=_content_key(content, previous, attempt),
+        parse=parse_quiz_items,
+        temperature=temperature,
+        variation=variation,
+    )
+
+
+def generate_quiz_items(content, temperature=1.0, variation=None, count=5, previous=None, attempt=0):
+    if _needs_chunking(content):
+        item_lists = _generate_chunked(
+            content, count,
+            lambda chunk, n: _quiz_items(chunk, temperature, variation, n, previous, attempt),
+        )
+        return chunking.merge_unique(item_lists, count)
+    return _quiz_items(content, temperature, variation, count, previous, attempt)
+
+
+def _flashcard_items(content, count, previous, attempt):
+    return generate(
+        build_flashcard_prompt(content, count, previous),
+        template_version=f'{FLASHCARD_TEMPLATE_VERSION}:{count}',
+        content=_content_key(content, previous, attempt),
+        parse=parse_flashcard_items,
+    )
+
+
+def generate_flashcard_items(content, count=5, previous=None, attempt=0):
+    if _needs_chunking(content):
+        item_lists = _generate_chunked(
+            content, count,
+            lambda chunk, n: _flashcard_items(chunk, n, previous, attempt),
+        )
+        return chunking.merge_unique(item_lists, count)
+    return _flashcard_items(content, count, previous, attempt)
+
+
+def _study_set_items(content, temperature, variation, count, previous_questions, previous_flashcards):
+    previous = [previous_questions, previous_flashcards] if previous_questions or previous_flashcards else None
+    return generate(
+        build_study_set_prompt(content, variation, count, previous_questions, previous_flashcards),
+        template_version=f'{STUDY_SET_TEMPLATE_VERSION}:{count}',
+        content=[content, previous] if previous else content,
+        parse=parse_study_set,
+        temperature=temperature,
+        variation=variation,
+    )
+
+
+def generate_study_set_items(content, temperature=1.0, variation=None, count=5,
+                             previous_questions=None, previous_flashcards=None):
+    if _needs_chunking(content):
+        study_sets = _generate_chunked(
+            content, count,
+            lambda chunk, n: _study_set_items(
+                chunk, temperature, variation, n, previous_questions, previous_flashcards
+            ),
+        )
+        return {
+            "questions": chunking.merge_unique([s['questions'] for s in study_sets], count),
+            "flashcards": chunking.merge_unique([s['flashcards'] for s in study_sets], count),
+        }
+    return _study_set_items(content, temperature, variation, count, previous_questions, previous_flashcards)
+
+
+def collect_new_items(generate_batch, index, count, items=()):
+    """
+    Keep calling generate_batch(n, attempt) until `count` items that don't
+    near-duplicate anything in index are collected, asking only for the
+    shortfall each round.
+
+    The rounds share one rate-limit reservation taken up front (a token
+    per round where the user has them, at least one). If the limiter
+    refuses a later round, the items collected so far are returned.
+    """
+    items = index.filter_new(items)
+    if len(items) >= count:
+        return items[:count]
+    try:
+        with ratelimit.reserve(MAX_GENERATION_ROUNDS, minimum=1):
+            for attempt in range(MAX_GENERATION_ROUNDS):
+                items += index.filter_new(generate_batch(count - len(items), attempt))
+                if len(items) >= count:
+                    break
+    except (ratelimit.RateLimitExceeded, ratelimit.CircuitOpenError):
+        if not items:
+            raise
+    if not items:
+        raise GenerationFormatError("Could not generate new questions for this note")
+    return items[:count]
+
+
+def create_quiz(note, temperature=1.0, variation=None, count=5):
+    index = dedup.QuestionIndex.for_note(note, 'quiz')
+    quiz_data = collect_new_items(
+        lambda n, attempt: generate_quiz_items(note.content, temperature, variation, n, index.summary(), attempt),
+        index, count,
+    )
+    return persistence.save_quiz(note, quiz_data)
+
+
+def create_flashcards(note, count=5):
+    index = dedup.QuestionIndex.for_note(note, 'flashcards')
+    flashcard_data = collect_new_items(
+        lambda n, attempt: generate_flashcard_items(note.content, n, index.summary(), attempt),
+        index, count,
+    )
+    return persistence.save_flashcards(note, flashcard_data)
+
+
+def create_study_set(note, temperature=1.0, variation=None, count=5):
+    """Generate a quiz of `count` questions and `count` flashcards for note from a single model response."""
+    question_index = dedup.QuestionIndex.for_note(note, 'quiz')
+    flashcard_index = dedup.QuestionIndex.for_note(note, 'flashcards')
+    study_set = generate_study_set_items(
+        note.content, temperature, variation, count,
+        previous_questions=question_index.summary(),
+        previous_flashcards=flashcard_index.summary(),
+    )
+    # Any shortfall after dropping near-duplicates is topped up with
+    # single-kind requests for just the missing items.
+    questions = collect_new_items(
+        lambda n, attempt: generate_quiz_items(
+            note.content, temperature, variation, n, question_index.summary(), attempt + 1
+        ),
+        question_index, count, study_set['questions'],
+    )
+    flashcard_items = collect_new_items(
+        lambda n, attempt: generate_flashcard_items(note.content, n, flashcard_index.summary(), attempt + 1),
+        flashcard_index, count, study_set['flashcards'],
+    )
+    with transaction.atomic():
+        quiz = persistence.save_quiz(note, questions)
+        flashcards = persistence.save_flashcards(note, flashcard_items)
+    return quiz, flashcards
+
+
+# Slots for Gemini calls, shared by every map_concurrently nested under the
+# outermost one so a fan-out within a fan-out stays within one bound.
+_call_slots = contextvars.ContextVar('generation_call_slots', default=None)
+
+
+@contextmanager
+def _call_slot():
+    slots = _call_slots.get()
+    if slots is None:
+        yield
+        return
+    with slots:
+        yield
+
+
+def map_concurrently(fn, items, max_workers=None):
+    """
+    Call fn(item) for every item on a bounded thread pool.
+
+    Returns (item, result, error) tuples in input order; one failing item
+    does not stop the others. Nested calls (e.g. chunks of one note inside
+    a notebook fan-out) share the outermost call's bound on concurrent
+    Gemini calls.
+    """
+    items = list(items)
+    if max_workers is None:
+        max_workers = getattr(settings, 'GENERATION_MAX_WORKERS', 4)
+    token = None
+    if _call_slots.get() is None:
+        token = _call_slots.set(threading.BoundedSemaphore(max(1, max_workers)))
+    max_workers = max(1, min(max_workers, len(items) or 1))
+
+    def call(item, context):
+        try:
+            return item, context.run(fn, item), None
+        except Exception as e:
+            return item, None, e
+        finally:
+            # The limiter and breaker hit the DB-backed caches from this
+            # thread, which opens its own connections; don't leak them.
+            connections.close_all()
+
+    # Run each call in a copy of the caller's context so the rate limiter
+    # still charges the acting user from the pool threads, and nested calls
+    # find the shared slots.
+    try:
+        contexts = [contextvars.copy_context() for _ in items]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(call, items, contexts))
+    finally:
+        if token is not None:
+            _call_slots.reset(token)
+
+
+NOTEBOOK_KINDS = ('flashcards', 'quiz')
+
+
+def generate_for_notebook(notebook, kinds=NOTEBOOK_KINDS, max_workers=None):
+    """
+    Generate flashcards and/or a quiz for every note in notebook.
+
+    Gemini calls fan out over a bounded thread pool; results are saved from
+    the calling thread in a single batch. Returns one report dict per note.
+    """
+    notes = list(Note.objects.filter(notebook=notebook).order_by('id'))
+    tasks = [(note, kind) for note in notes for kind in kinds]
+    indexes = {kind: dedup.QuestionIndex.for_notes(notes, kind) for kind in kinds}
+
+    def run(task):
+        note, kind = task
+        index = indexes[kind][note.id]
+        if kind == 'quiz':
+            return collect_new_items(
+                lambda n, attempt: generate_quiz_items(note.content, count=n, previous=index.summary(), attempt=attempt),
+                index, 5,
+            )
+        return collect_new_items(
+            lambda n, attempt: generate_flashcard_items(note.content, n, index.summary(), attempt),
+            index, 5,
+        )
+
+    reports = {note.id: {"note_id": note.id, "title": note.title} for note in notes}
+
+    def record_error(note, kind, error):
+        status_code, body = describe_error(error, f"Failed to generate {kind}.")
+        reports[note.id].setdefault("errors", {})[kind] = dict(body, status=status_code)
+
+    generated = {kind: [] for kind in kinds}
+    # The user's tokens for the whole notebook are taken before any call is made.
+    with ratelimit.reserve(estimated_calls([note.content for note in notes], len(kinds))):
+        results = map_concurrently(run, tasks, max_workers)
+    for (note, kind), items, error in results:
+        if error is None:
+            generated[kind].append((note, items))
+        else:
+            record_error(note, kind, error)
+
+    # Everything that was generated is saved in one transaction with one
+    # INSERT per table, however many notes the notebook has.
+    try:
+        with transaction.atomic():
+            quizzes = persistence.save_quizzes(generated.get('quiz', []))
+            flashcard_sets = persistence.save_flashcard_sets(generated.get('flashcards', []))
+    except Exception as e:
+        for kind, entries in generated.items():
+            for note, _ in entries:
+                record_error(note, kind, e)
+        return list(reports.values())
+
+    for (note, _), quiz in zip(generated.get('quiz', []), quizzes):
+        reports[note.id]["quiz_id"] = quiz.id
+    for (note, _), flashcards in zip(generated.get('flashcards', []), flashcard_sets):
+        reports[note.id]["flashcard_ids"] = [fc.id for fc in flashcards]
+    return list(reports.values())
+
+
+def create_note(notebook, title, prompt=''):
+    plain_text = generate(
+        build_note_prompt(title, prompt),
+        template_version=NOTE_TEMPLATE_VERSION,
+        content=[title, prompt],
+        parse=parse_note_content,
+    )
+    return Note.objects.create(
+        notebook=notebook,
+        title=title,
+        content=plain_text
+    )
+
+
+def describe_error(exc, failure_message):
+    """Map an exception raised while generating to (http_status, response_body)."""
+    if isinstance(exc, json.JSONDecodeError):
+        return 500, {
+            "error": "Could not parse Gemini output",
+            "raw": exc.doc
+        }
+    if isinstance(exc, GenerationFormatError):
+        return 400, {"error": str(exc)}
+    if isinstance(exc, ratelimit.RateLimitExceeded):
+        return 429, {
+            "error": "Too many AI requests. Please try again shortly.",
+            "details": str(exc),
+            "retry_after": round(exc.retry_after)
+        }
+    if isinstance(exc, ratelimit.CircuitOpenError):
+        return 503, {
+            "error": "AI service temporarily unavailable. Please try again later.",
+            "details": str(exc),
+            "retry_after": round(exc.retry_after)
+        }
+
+    error_message = str(exc)
+
+    # Handle quota exceeded error
+    if "429" in error_message or "quota" in error_message.lower() or "exceeded" in error_message.lower():
+        return 429, {
+            "error": "AI service quota exceeded. Please try again tomorrow or upgrade your plan.",
+            "details": "You've reached the daily limit for AI requests."
+        }
+
+    # Handle other AI errors
+    if "google.api_core.exceptions" in str(type(exc)):
+        return 503, {
+            "error": "AI service temporarily unavailable. Please try again later.",
+            "details": error_message
+        }
+
+    return 500, {
+        "error": failure_message,
+        "details": error_message
+    }
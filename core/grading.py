@@ -0,0 +1,77 @@
+"""
+Answer keys and quiz grading.
+
+Each Question stores the index of its correct option (`correct_index`),
+resolved once when the question is saved, so grading a submission is a
+plain index comparison and a whole batch of quizzes can be graded from a
+single query.
+"""
+import re
+
+from .models import Question
+
+LETTERS = 'ABCD'
+_OPTION_PREFIX = re.compile(r'^[A-D]\.\s*')
+
+
+def _clean_option(text):
+    """Strip a leading "A. " style label and normalize case/whitespace."""
+    return _OPTION_PREFIX.sub('', str(text).strip()).lower()
+
+
+def resolve_correct_index(correct, options):
+    """
+    Index of the correct option, or None if it cannot be resolved.
+
+    `correct` is either a letter (A-D) or the text of one of the options,
+    possibly with its letter prefix.
+    """
+    correct = str(correct or '').strip()
+    if len(correct) == 1 and correct.upper() in LETTERS:
+        return LETTERS.index(correct.upper())
+    target = _clean_option(correct)
+    for idx, option in enumerate(options or []):
+        if _clean_option(option) == target:
+            return idx
+    return None
+
+
+def answer_index(answer):
+    """Index chosen by a submitted answer letter, or None for a blank/invalid answer."""
+    answer = str(answer or '').strip().upper()
+    if len(answer) == 1 and answer in LETTERS:
+        return LETTERS.index(answer)
+    return None
+
+
+def answer_keys(quiz_ids):
+    """Return {quiz_id: [correct_index, ...]} in question order, from one query."""
+    quiz_ids = list(quiz_ids)
+    keys = {quiz_id: [] for quiz_id in quiz_ids}
+    unresolved = []
+    rows = Question.objects.filter(quiz_id__in=quiz_ids).order_by('id').values_list('id', 'quiz_id', 'correct_index')
+    for question_id, quiz_id, index in rows:
+        if index is None:
+            unresolved.append((quiz_id, len(keys[quiz_id]), question_id))
+        keys[quiz_id].append(index)
+
+    # Rows saved before answer keys existed (until backfill_answer_keys has run).
+    if unresolved:
+        fallback = {
+            question_id: resolve_correct_index(correct, options)
+            for question_id, correct, options in Question.objects.filter(
+                id__in=[question_id for _, _, question_id in unresolved]
+            ).values_list('id', 'correct', 'options')
+        }
+        for quiz_id, position, question_id in unresolved:
+            keys[quiz_id][position] = fallback.get(question_id)
+    return keys
+
+
+def grade(answers, key):
+    """Return (correct_count, [is_correct per question]) for one submission."""
+    results = [
+        index is not None and answer_index(answer) == index
+        for answer, index in zip(answers, key)
+    ]
+    return sum(results), results
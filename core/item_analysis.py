@@ -0,0 +1,113 @@
+"""
+Per-question item analysis for a quiz.
+
+All attempts at a quiz are loaded into an (attempts x questions) matrix of
+chosen option indexes, and every statistic is computed from it with NumPy
+array operations:
+
+- difficulty: share of attempts answering the question correctly;
+- discrimination: difficulty among the top 27% of attempts by total score
+  minus difficulty among the bottom 27% (upper-lower index);
+- distractors: how often each option (and no valid option) was chosen.
+
+Results are cached under the quiz's attempt count and latest attempt id, so
+they are recomputed only after new attempts arrive.
+"""
+import numpy as np
+from django.core.cache import cache
+from django.db.models import Count, Max
+
+from .grading import LETTERS, answer_index, answer_keys
+from .models import Question, QuizAttempt
+
+GROUP_FRACTION = 0.27
+CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def _chosen_index(answer):
+    index = answer_index(answer)
+    return -1 if index is None else index
+
+
+def answer_matrix(answer_lists, question_count):
+    """Chosen option index per attempt and question; -1 for blank or invalid answers."""
+    rows = [answers for answers in answer_lists if isinstance(answers, list) and len(answers) == question_count]
+    if not rows or not question_count:
+        return np.empty((0, question_count), dtype=np.int8)
+    # Stored answers are unvalidated JSON (a cell may be a list or object),
+    # so each one goes through answer_index rather than a string array.
+    return np.array([[_chosen_index(answer) for answer in answers] for answers in rows], dtype=np.int8)
+
+
+def analyze(chosen, key):
+    """Statistics for an answer matrix and the correct index per question (None if unresolved)."""
+    attempts, questions = chosen.shape
+    key = np.array([-1 if index is None else index for index in key], dtype=np.int8)
+    correct = (chosen == key) & (key >= 0)
+
+    # Option counts: (options + blank) x questions.
+    counts = np.stack([(chosen == option).sum(axis=0) for option in range(len(LETTERS))] + [(chosen < 0).sum(axis=0)])
+
+    if attempts:
+        difficulty = correct.mean(axis=0)
+        group = max(1, int(round(attempts * GROUP_FRACTION)))
+        order = np.argsort(correct.sum(axis=1), kind='stable')
+        discrimination = correct[order[-group:]].mean(axis=0) - correct[order[:group]].mean(axis=0)
+    else:
+        difficulty = discrimination = np.full(questions, np.nan)
+
+    return {
+        'attempts': attempts,
+        'difficulty': difficulty,
+        'discrimination': discrimination,
+        'option_counts': counts[:-1].T,
+        'blank_counts': counts[-1],
+        'resolved': key >= 0,
+    }
+
+
+def _round(value):
+    return None if np.isnan(value) else round(float(value), 4)
+
+
+def quiz_item_analysis(quiz):
+    """Item analysis report for quiz, from cache when no attempts have arrived since."""
+    stamp = QuizAttempt.objects.filter(quiz=quiz).aggregate(count=Count('id'), last=Max('id'))
+    cache_key = f"item_analysis:{quiz.id}:{stamp['count']}:{stamp['last']}"
+    report = cache.get(cache_key)
+    if report is not None:
+        return report
+
+    questions = list(Question.objects.filter(quiz=quiz).order_by('id').values('id', 'question', 'options'))
+    key = answer_keys([quiz.id])[quiz.id]
+    chosen = answer_matrix(
+        QuizAttempt.objects.filter(quiz=quiz).values_list('answers', flat=True).iterator(chunk_size=5000),
+        len(questions)
+    )
+    stats = analyze(chosen, key)
+    attempts = stats['attempts']
+
+    items = []
+    for i, question in enumerate(questions):
+        options = question['options'] or []
+        items.append({
+            "question_id": question['id'],
+            "question": question['question'],
+            "correct_index": key[i],
+            "difficulty": _round(stats['difficulty'][i]) if stats['resolved'][i] else None,
+            "discrimination": _round(stats['discrimination'][i]) if stats['resolved'][i] else None,
+            "options": [
+                {
+                    "option": options[o] if o < len(options) else LETTERS[o],
+                    "count": int(stats['option_counts'][i][o]),
+                    "share": round(int(stats['option_counts'][i][o]) / attempts, 4) if attempts else 0,
+                    "correct": key[i] == o
+                }
+                for o in range(min(len(options), len(LETTERS)) or len(LETTERS))
+            ],
+            "blank": int(stats['blank_counts'][i])
+        })
+
+    report = {"quiz_id": quiz.id, "attempts": attempts, "questions": items}
+    cache.set(cache_key, report, CACHE_TIMEOUT)
+    return report
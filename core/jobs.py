@@ -0,0 +1,155 @@
+"""
+DB-backed queue for AI generation jobs.
+
+Endpoints enqueue a GenerationJob and return immediately; the
+`run_generation_worker` management command claims pending jobs and runs
+them off the web workers.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import activity, generation, ratelimit
+from .models import GenerationJob, Note, Notebook
+
+# Time a job may spend generating on top of waiting for rate-limit capacity.
+GENERATION_MARGIN = 300
+
+
+def _run_quiz(job):
+    note = Note.objects.get(id=job.params['note_id'], notebook__user=job.user)
+    quiz = generation.create_quiz(
+        note,
+        temperature=job.params.get('temperature', 1.0),
+        variation=job.params.get('variation'),
+    )
+    return {"quiz_id": quiz.id}
+
+
+def _run_flashcards(job):
+    note = Note.objects.get(id=job.params['note_id'], notebook__user=job.user)
+    flashcards = generation.create_flashcards(note)
+    return {"flashcard_ids": [fc.id for fc in flashcards]}
+
+
+def _run_study_set(job):
+    note = Note.objects.get(id=job.params['note_id'], notebook__user=job.user)
+    quiz, flashcards = generation.create_study_set(
+        note,
+        temperature=job.params.get('temperature', 1.0),
+        variation=job.params.get('variation'),
+    )
+    return {"quiz_id": quiz.id, "flashcard_ids": [fc.id for fc in flashcards]}
+
+
+class JobFailed(Exception):
+    """A runner finished but produced nothing usable; fails the job with the given status and body."""
+
+    def __init__(self, error_status, error, result=None):
+        super().__init__(error.get("error", "Generation job failed"))
+        self.error_status = error_status
+        self.error = error
+        self.result = result
+
+
+def _run_notebook(job):
+    notebook = Notebook.objects.get(id=job.params['notebook_id'], user=job.user)
+    kinds = job.params.get('kinds') or generation.NOTEBOOK_KINDS
+    reports = generation.generate_for_notebook(notebook, kinds)
+    failed = [report for report in reports if report.get("errors")]
+    if reports and len(failed) == len(reports):
+        # Nothing succeeded; fail with the upstream error (e.g. 429), as generate_notebook does.
+        error = dict(next(iter(failed[0]["errors"].values())))
+        raise JobFailed(error.pop("status"), error, {"notes": reports})
+    return {"notes": reports}
+
+
+def _run_note(job):
+    notebook = Notebook.objects.get(id=job.params['notebook_id'], user=job.user)
+    note = generation.create_note(notebook, job.params['title'], job.params.get('prompt', ''))
+    activity.log(job.user, 'note', note.id, {"generated": True})
+    return {"note_id": note.id}
+
+
+JOB_RUNNERS = {
+    'quiz': (_run_quiz, "Failed to generate quiz. Please try again."),
+    'flashcards': (_run_flashcards, "Failed to generate flashcards. Please try again."),
+    'study_set': (_run_study_set, "Failed to generate study set. Please try again."),
+    'notebook': (_run_notebook, "Failed to generate notebook content. Please try again."),
+    'note': (_run_note, "Failed to generate note. Please try again."),
+}
+
+
+def enqueue(user, kind, params):
+    if kind not in JOB_RUNNERS:
+        raise ValueError(f"Unknown generation job kind: {kind}")
+    return GenerationJob.objects.create(user=user, kind=kind, params=params)
+
+
+def claim_jobs(limit):
+    """Atomically mark up to `limit` pending jobs as running and return them."""
+    if limit <= 0:
+        return []
+    with transaction.atomic():
+        jobs = list(
+            GenerationJob.objects.select_for_update(skip_locked=True)
+            .filter(status='pending')
+            .order_by('created_at')[:limit]
+        )
+        if jobs:
+            now = timezone.now()
+            GenerationJob.objects.filter(id__in=[job.id for job in jobs]).update(status='running', started_at=now)
+            for job in jobs:
+                job.status = 'running'
+                job.started_at = now
+    return jobs
+
+
+def stale_after():
+    """
+    How long a job can legitimately stay 'running': the limiter wait
+    (JOB_MAX_WAIT) plus GENERATION_MARGIN. Requeueing sooner would run a
+    live job twice.
+    """
+    return timedelta(seconds=ratelimit.get_config()['JOB_MAX_WAIT'] + GENERATION_MARGIN)
+
+
+def requeue_stale_jobs(older_than=None):
+    """Return jobs stuck in 'running' (e.g. after a worker crash) to the queue."""
+    if older_than is None:
+        older_than = stale_after()
+    cutoff = timezone.now() - older_than
+    return GenerationJob.objects.filter(status='running', started_at__lt=cutoff).update(status='pending', started_at=None)
+
+
+def run_job(job):
+    runner, failure_message = JOB_RUNNERS[job.kind]
+    try:
+        with ratelimit.acting_user(job.user_id), ratelimit.waiting(ratelimit.get_config()['JOB_MAX_WAIT']):
+            job.result = runner(job)
+        job.status = 'succeeded'
+    except JobFailed as e:
+        job.result, job.error_status, job.error = e.result, e.error_status, e.error
+        job.status = 'failed'
+    except Exception as e:
+        print(f"Error in generation job {job.id}: {e}")
+        job.error_status, job.error = generation.describe_error(e, failure_message)
+        job.status = 'failed'
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'result', 'error', 'error_status', 'finished_at'])
+    return job
+
+
+def serialize_job(job):
+    return {
+        "job_id": str(job.id),
+        "kind": job.kind,
+        "status": job.status,
+        "result": job.result,
+        "error": job.error,
+        "error_status": job.error_status,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
@@ -0,0 +1,183 @@
+"""
+Ranked leaderboard index and queries.
+
+A Fenwick (binary indexed) tree counts users with points per point
+bucket, one LeaderboardNode row per tree node, so "how many users have
+more points than p" reads the O(log n) nodes on two prefix paths in one
+query, plus, for bucket sizes above 1, an index range count inside p's
+own bucket. The awarding transaction moves the user between buckets
+with a single UPDATE of the nodes whose counts change, so the tree
+commits (or rolls back) together with UserStats.
+
+UserStats stays the source of truth: until `manage.py rebuild_leaderboard`
+has built the tree (run it after `migrate`), ranks are counted from
+UserStats directly. A rebuild locks the node rows before recounting, so it
+is safe while points are being awarded: a move that is still in flight
+waits for the rebuild and then applies on top of it.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Q, Value, When
+
+from .models import LeaderboardNode, UserStats
+
+DEFAULTS = {
+    'BUCKET_SIZE': 10,  # points per bucket; points are awarded in tens
+    'BUCKETS': 4096,    # scores past BUCKETS * BUCKET_SIZE share the top bucket
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'LEADERBOARD', {})}
+
+
+def _bucket(points):
+    """1-based Fenwick position of the bucket holding `points`."""
+    config = get_config()
+    return min(points // config['BUCKET_SIZE'], config['BUCKETS'] - 1) + 1
+
+
+def _bucket_end(points):
+    """Lowest point value above `points`' bucket, or None for the open-ended top bucket."""
+    config = get_config()
+    position = _bucket(points)
+    return None if position == config['BUCKETS'] else position * config['BUCKET_SIZE']
+
+
+def _prefix_path(i):
+    path = []
+    while i > 0:
+        path.append(i)
+        i -= i & -i
+    return path
+
+
+def _update_path(i, size):
+    path = []
+    while i <= size:
+        path.append(i)
+        i += i & -i
+    return path
+
+
+def count_above(points):
+    """Number of users with strictly more than `points` points."""
+    size = get_config()['BUCKETS']
+    position = _bucket(points)
+    nodes = set(_prefix_path(position)) | set(_prefix_path(size))
+    counts = dict(LeaderboardNode.objects.filter(node__in=nodes).values_list('node', 'users'))
+    if len(counts) != len(nodes):
+        # Tree not built yet.
+        return UserStats.objects.filter(total_points__gt=points).count()
+
+    above = sum(counts[node] for node in _prefix_path(size)) - sum(counts[node] for node in _prefix_path(position))
+    # Users in the same bucket but with more points; skipped when the bucket can't hold any.
+    end = _bucket_end(points)
+    if end is None:
+        above += UserStats.objects.filter(total_points__gt=points).count()
+    elif points + 1 < end:
+        above += UserStats.objects.filter(total_points__gt=points, total_points__lt=end).count()
+    return above
+
+
+def rank_of(points):
+    """Competition rank (1 = most points) of a score."""
+    return count_above(points) + 1
+
+
+def record_change(old_points, new_points):
+    """Move a user from old_points' bucket to new_points' (users with no points are not counted)."""
+    size = get_config()['BUCKETS']
+    deltas = {}
+    if old_points > 0:
+        for node in _update_path(_bucket(old_points), size):
+            deltas[node] = deltas.get(node, 0) - 1
+    if new_points > 0:
+        for node in _update_path(_bucket(new_points), size):
+            deltas[node] = deltas.get(node, 0) + 1
+    deltas = {node: delta for node, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    LeaderboardNode.objects.filter(node__in=deltas).update(users=F('users') + Case(
+        *[When(node=node, then=Value(delta)) for node, delta in deltas.items()], default=Value(0)
+    ))
+
+
+def rebuild():
+    """Rebuild the tree from UserStats in linear time; returns the number of users with points."""
+    size = get_config()['BUCKETS']
+    with transaction.atomic():
+        # Awards move users inside their own transactions; holding every
+        # node row lock means none is half-counted while UserStats is read.
+        existing = set(LeaderboardNode.objects.select_for_update().values_list('node', flat=True))
+        tree = [0] * (size + 1)
+        ranked = 0
+        for points in UserStats.objects.filter(total_points__gt=0).values_list('total_points', flat=True).iterator(chunk_size=5000):
+            tree[_bucket(points)] += 1
+            ranked += 1
+        for i in range(1, size + 1):
+            parent = i + (i & -i)
+            if parent <= size:
+                tree[parent] += tree[i]
+        LeaderboardNode.objects.filter(node__gt=size).delete()
+        LeaderboardNode.objects.bulk_update(
+            [LeaderboardNode(node=i, users=tree[i]) for i in range(1, size + 1) if i in existing], ['users'], batch_size=1000
+        )
+        LeaderboardNode.objects.bulk_create(
+            [LeaderboardNode(node=i, users=tree[i]) for i in range(1, size + 1) if i not in existing]
+        )
+    return ranked
+
+
+def _entry(stat, rank):
+    return {
+        'user_id': stat.user_id,
+        'username': stat.user.username,
+        'total_points': stat.total_points,
+        'rank': rank
+    }
+
+
+def top(limit):
+    """The `limit` highest scores, read through the (-total_points, user) index."""
+    stats = UserStats.objects.select_related('user').order_by('-total_points', 'user_id')[:limit]
+    entries = []
+    for position, stat in enumerate(stats, start=1):
+        rank = entries[-1]['rank'] if entries and entries[-1]['total_points'] == stat.total_points else position
+        entries.append(_entry(stat, rank))
+    return entries
+
+
+def around(stat, window):
+    """
+    Up to `window` users either side of `stat` in leaderboard order
+    (points descending, then user id), with their ranks.
+    """
+    points, user_id = stat.total_points, stat.user_id
+    base = UserStats.objects.select_related('user')
+    before = list(reversed(
+        base.filter(Q(total_points__gt=points) | Q(total_points=points, user_id__lt=user_id))
+        .order_by('total_points', '-user_id')[:window]
+    ))
+    after = list(
+        base.filter(Q(total_points__lt=points) | Q(total_points=points, user_id__gt=user_id))
+        .order_by('-total_points', 'user_id')[:window]
+    )
+    rows = before + [stat] + after
+
+    # Positions in a contiguous run of the ordering determine ranks, except
+    # for the first row whose tied neighbours may sit outside the window.
+    user_rank = rank_of(points)
+    first_position = user_rank + base.filter(total_points=points, user_id__lt=user_id).count() - len(before)
+    entries = []
+    for offset, row in enumerate(rows):
+        if row is stat:
+            rank = user_rank
+        elif entries and entries[-1]['total_points'] == row.total_points:
+            rank = entries[-1]['rank']
+        elif offset == 0:
+            rank = rank_of(row.total_points)
+        else:
+            rank = first_position + offset
+        entries.append(_entry(row, rank))
+    return entries
@@ -0,0 +1,175 @@
+"""
+LLM backends used by core.generation.
+
+The backend is chosen by settings.LLM_BACKEND: 'gemini' talks to Google's
+API, 'fake' answers locally (replaying recorded responses when available)
+so the generation endpoints can be exercised and load-tested offline.
+"""
+import hashlib
+import json
+import threading
+import time
+
+from django.conf import settings
+
+
+_genai = None
+_genai_lock = threading.Lock()
+
+
+def get_genai(api_key):
+    """
+    Import and configure the Google AI SDK on first use.
+
+    The SDK is slow to import, so it is kept out of module import time;
+    workers and management commands that never generate don't pay for it.
+    """
+    global _genai
+    if _genai is None:
+        with _genai_lock:
+            if _genai is None:
+                import google.generativeai as genai
+                genai.configure(api_key=api_key)
+                _genai = genai
+    return _genai
+
+
+def _config_key(generation_config):
+    return json.dumps(generation_config or {}, sort_keys=True)
+
+
+class LLMBackend:
+    name = None
+    model_name = None
+
+    def cache_identity(self):
+        """What distinguishes this backend's output in generation cache keys."""
+        return [self.name, self.model_name]
+
+    def is_configured(self):
+        return True
+
+    def generate(self, prompt, generation_config=None):
+        """Return the complete response text for prompt."""
+        raise NotImplementedError
+
+    def stream(self, prompt, generation_config=None):
+        """Yield the response text in pieces as it is produced."""
+        yield self.generate(prompt, generation_config)
+
+
+class GeminiBackend(LLMBackend):
+    name = 'gemini'
+
+    def __init__(self, model_name, api_key):
+        self.model_name = model_name
+        self.api_key = api_key
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def is_configured(self):
+        return bool(self.api_key)
+
+    def get_model(self, generation_config=None):
+        """Return a GenerativeModel for generation_config, reusing one per distinct config."""
+        key = _config_key(generation_config)
+        model = self._models.get(key)
+        if model is None:
+            with self._lock:
+                model = self._models.get(key)
+                if model is None:
+                    genai = get_genai(self.api_key)
+                    model = genai.GenerativeModel(self.model_name, generation_config=generation_config)
+                    self._models[key] = model
+        return model
+
+    def generate(self, prompt, generation_config=None):
+        return self.get_model(generation_config).generate_content(prompt).text
+
+    def stream(self, prompt, generation_config=None):
+        for chunk in self.get_model(generation_config).generate_content(prompt, stream=True):
+            if chunk.text:
+                yield chunk.text
+
+
+class FakeBackend(LLMBackend):
+    """
+    Deterministic local backend.
+
+    Responses recorded in `replay_file` (a JSON object mapping the SHA-256 of
+    a prompt to its response text) are replayed verbatim; other prompts get
+    a canned response in the shape the prompt asks for, seeded by the prompt
+    hash so the same prompt always produces the same output.
+    """
+    name = 'fake'
+
+    def __init__(self, replay_file=None, latency=0.0):
+        self.latency = latency
+        self.responses = {}
+        if replay_file:
+            with open(replay_file, encoding='utf-8') as f:
+                self.responses = json.load(f)
+
+    @staticmethod
+    def prompt_hash(prompt):
+        return hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+
+    def generate(self, prompt, generation_config=None):
+        if self.latency:
+            time.sleep(self.latency)
+        digest = self.prompt_hash(prompt)
+        if digest in self.responses:
+            return self.responses[digest]
+        return self._synthesize(prompt, digest[:8], generation_config or {})
+
+    def stream(self, prompt, generation_config=None):
+        text = self.generate(prompt, generation_config)
+        for start in range(0, len(text), 40):
+            yield text[start:start + 40]
+
+    def _synthesize(self, prompt, seed, generation_config):
+        questions = [
+            {
+                "question": f"Sample question {i + 1} ({seed})?",
+                "options": [f"Option {letter} ({seed})" for letter in "ABCD"],
+                "correct": "ABCD"[i % 4],
+            }
+            for i in range(5)
+        ]
+        flashcards = [
+            {"question": f"Sample flashcard {i + 1} ({seed})?", "answer": f"Sample answer {i + 1}."}
+            for i in range(5)
+        ]
+        paragraph = f"This is a locally generated sample paragraph ({seed}) used in place of a real model response."
+
+        if generation_config.get("response_mime_type") != "application/json":
+            return paragraph
+        if '"questions"' in prompt and '"flashcards"' in prompt:
+            return json.dumps({"questions": questions, "flashcards": flashcards})
+        if '"options"' in prompt:
+            return json.dumps(questions)
+        if '"answer"' in prompt:
+            return json.dumps(flashcards)
+        return json.dumps({"content": paragraph})
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def build_llm_backend(config):
+    name = config.get('BACKEND', 'gemini')
+    if name == 'gemini':
+        return GeminiBackend(config.get('MODEL', 'gemini-2.0-flash'), getattr(settings, 'GEMINI_API_KEY', None))
+    if name == 'fake':
+        return FakeBackend(replay_file=config.get('REPLAY_FILE'), latency=config.get('LATENCY', 0.0))
+    raise ValueError(f"Unknown LLM backend: {name}")
+
+
+def get_llm_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = build_llm_backend(getattr(settings, 'LLM_BACKEND', {}))
+    return _backend
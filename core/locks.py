@@ -0,0 +1,25 @@
+"""Cross-process mutex built on cache.add, shared by the cache-backed subsystems."""
+import time
+import uuid
+from contextlib import contextmanager
+
+
+@contextmanager
+def cache_lock(cache, key, timeout, wait):
+    """
+    Try for up to `wait` seconds to take the lock `key:lock` in cache and
+    yield whether it was acquired; callers decide whether to proceed without
+    it. `timeout` bounds how long a crashed holder can block others.
+    """
+    lock_key = f'{key}:lock'
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + wait
+    acquired = cache.add(lock_key, token, timeout)
+    while not acquired and time.monotonic() < deadline:
+        time.sleep(0.01)
+        acquired = cache.add(lock_key, token, timeout)
+    try:
+        yield acquired
+    finally:
+        if acquired and cache.get(lock_key) == token:
+            cache.delete(lock_key)
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from core.grading import resolve_correct_index
+from core.models import Question
+
+
+class Command(BaseCommand):
+    help = "Resolve Question.correct_index for questions saved before answer keys were stored."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--all', action='store_true', help="Recompute every question, not just those missing a key.")
+
+    def handle(self, *args, **options):
+        questions = Question.objects.only('id', 'correct', 'options', 'correct_index').order_by('id')
+        if not options['all']:
+            questions = questions.filter(correct_index__isnull=True)
+
+        batch, updated, unresolved = [], 0, 0
+        for question in questions.iterator(chunk_size=options['batch_size']):
+            question.correct_index = resolve_correct_index(question.correct, question.options)
+            if question.correct_index is None:
+                unresolved += 1
+                self.stderr.write(f"Question {question.id}: correct answer {question.correct!r} matches no option")
+            batch.append(question)
+            if len(batch) >= options['batch_size']:
+                updated += Question.objects.bulk_update(batch, ['correct_index'])
+                batch = []
+        if batch:
+            updated += Question.objects.bulk_update(batch, ['correct_index'])
+        self.stdout.write(self.style.SUCCESS(f"Done: {updated} questions updated, {unresolved} unresolved."))
@@ -0,0 +1,25 @@
+from datetime import timedelta
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import UserStats
+from core.streaks import local_date, start_of_day
+
+
+class Command(BaseCommand):
+    help = "Reset the current streak of users who missed a whole day. Run at least daily (e.g. hourly from cron)."
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        active = UserStats.objects.filter(current_streak__gt=0)
+        reset = 0
+        # One UPDATE per time zone in use: a streak lapses once the user's
+        # last activity is before the start of their local yesterday.
+        for tz_name in active.values_list('user__timezone', flat=True).distinct():
+            tz = ZoneInfo(tz_name or settings.TIME_ZONE)
+            cutoff = start_of_day(local_date(now, tz) - timedelta(days=1), tz)
+            reset += active.filter(user__timezone=tz_name, last_activity__lt=cutoff).update(current_streak=0)
+        self.stdout.write(self.style.SUCCESS(f"Done: reset {reset} lapsed streaks."))
@@ -0,0 +1,74 @@
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import export
+from core.models import GroupMembership, StudyGroup
+
+
+class Command(BaseCommand):
+    help = "Stream quiz or flashcard attempts to CSV or JSON Lines with constant memory; --resume continues an interrupted --output file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(export.KINDS))
+        parser.add_argument('--format', choices=export.FORMATS, default='csv', dest='fmt')
+        parser.add_argument('--output', help="File to write (default stdout).")
+        parser.add_argument('--user', type=int, dest='user_ids', action='append', help="Only this user id (repeatable).")
+        parser.add_argument('--group', type=int, help="Only members' attempts on content shared with this study group.")
+        parser.add_argument('--since', help="Attempts at or after this date/datetime (ISO).")
+        parser.add_argument('--until', help="Attempts before this date/datetime (ISO).")
+        parser.add_argument('--after-id', type=int, help="Only attempts with a higher id.")
+        parser.add_argument('--before-id', type=int, help="Only attempts with a lower id.")
+        parser.add_argument('--chunk-size', type=int, default=export.CHUNK_SIZE)
+        parser.add_argument('--resume', action='store_true', help="Append to --output after the last complete row it holds.")
+
+    def handle(self, *args, **options):
+        kind, fmt, path = options['kind'], options['fmt'], options['output']
+        try:
+            since = export.parse_time(options['since']) if options['since'] else None
+            until = export.parse_time(options['until']) if options['until'] else None
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        user_ids, item_ids = options['user_ids'], None
+        if options['group'] is not None:
+            if not StudyGroup.objects.filter(id=options['group']).exists():
+                raise CommandError(f"Study group {options['group']} does not exist.")
+            members = GroupMembership.objects.filter(group_id=options['group'])
+            if user_ids:
+                members = members.filter(user_id__in=user_ids)
+            user_ids = members.values('user_id')
+            item_ids = export.shared_with_group(kind, options['group'])
+
+        after_id = options['after_id']
+        if options['resume']:
+            if not path:
+                raise CommandError("--resume needs --output.")
+            last_id = export.resume_file(path, fmt)
+            if last_id is not None:
+                after_id = max(after_id or 0, last_id)
+
+        queryset = export.attempts(
+            kind, user_ids, since=since, until=until, after_id=after_id, before_id=options['before_id'],
+            item_ids=item_ids,
+        )
+        if path:
+            append = options['resume'] and os.path.exists(path)
+            out = open(path, 'a' if append else 'w', encoding='utf-8', newline='')
+            header = not (append and os.path.getsize(path))
+        else:
+            out, header = sys.stdout, True
+
+        rows = 0
+        try:
+            for line in export.stream(kind, fmt, queryset, header=header, chunk_size=options['chunk_size']):
+                out.write(line)
+                rows += 1
+        finally:
+            if path:
+                out.close()
+        if header and fmt == 'csv':
+            rows -= 1
+        if path:
+            self.stdout.write(self.style.SUCCESS(f"Done: wrote {rows} {kind} attempts to {path}."))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core import generation
+from core.models import Notebook
+
+
+class Command(BaseCommand):
+    help = "Generate flashcards and/or a quiz for every note in a notebook."
+
+    def add_arguments(self, parser):
+        parser.add_argument('notebook_id', type=int)
+        parser.add_argument('--kinds', nargs='+', choices=generation.NOTEBOOK_KINDS, default=list(generation.NOTEBOOK_KINDS))
+        parser.add_argument('--workers', type=int, default=None, help="Concurrent Gemini calls (defaults to GENERATION_MAX_WORKERS).")
+
+    def handle(self, *args, **options):
+        try:
+            notebook = Notebook.objects.get(id=options['notebook_id'])
+        except Notebook.DoesNotExist:
+            raise CommandError(f"Notebook {options['notebook_id']} not found")
+        if not generation.is_configured():
+            raise CommandError("AI service not configured (GEMINI_API_KEY is not set)")
+
+        reports = generation.generate_for_notebook(notebook, options['kinds'], options['workers'])
+        failed = 0
+        for report in reports:
+            if report.get('errors'):
+                failed += 1
+                for kind, error in report['errors'].items():
+                    self.stderr.write(f"Note {report['note_id']} ({report['title']}): {kind} failed: {error['error']}")
+            else:
+                self.stdout.write(f"Note {report['note_id']} ({report['title']}): ok")
+        self.stdout.write(self.style.SUCCESS(f"Done: {len(reports) - failed}/{len(reports)} notes generated."))
@@ -0,0 +1,51 @@
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Report `python -X importtime` totals for importing a module (the URLconf by default) in a fresh interpreter."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--module', default=settings.ROOT_URLCONF, help="Module to import after django.setup().")
+        parser.add_argument('--top', type=int, default=15, help="Number of slowest packages to list.")
+
+    def handle(self, *args, **options):
+        module = options['module']
+        code = f"import django; django.setup(); import {module}"
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'studypal.settings'))
+        proc = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', code],
+            capture_output=True, text=True, env=env, cwd=settings.BASE_DIR,
+        )
+        if proc.returncode != 0:
+            raise CommandError(f"Importing {module} failed:\n{proc.stderr[-2000:]}")
+
+        # Lines look like: "import time:      self [us] |  cumulative | imported package"
+        entries = []
+        for line in proc.stderr.splitlines():
+            if not line.startswith('import time:') or 'imported package' in line:
+                continue
+            try:
+                self_us, cumulative_us, name = line[len('import time:'):].split('|')
+                entries.append((name.rstrip(), int(self_us), int(cumulative_us)))
+            except ValueError:
+                continue
+
+        # Top-level imports (no leading indentation) add up to the total.
+        total_us = sum(cumulative for name, _, cumulative in entries if not name.startswith('  '))
+        self.stdout.write(f"Imported {len(entries)} modules for {module} in {total_us / 1000:.1f} ms")
+
+        top_level = sorted(
+            ((name.strip(), cumulative) for name, _, cumulative in entries if name.strip().count('.') == 0),
+            key=lambda item: item[1], reverse=True,
+        )
+        self.stdout.write("Slowest top-level packages (cumulative):")
+        for name, cumulative in top_level[:options['top']]:
+            self.stdout.write(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+        sdk_loaded = any(name.strip() == 'google.generativeai' for name, _, _ in entries)
+        self.stdout.write(f"google.generativeai imported: {'yes' if sdk_loaded else 'no'}")
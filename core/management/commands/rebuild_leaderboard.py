@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core import leaderboard
+
+
+class Command(BaseCommand):
+    help = "Build or repair the leaderboard rank index from UserStats (run after migrate; safe while serving)."
+
+    def handle(self, *args, **options):
+        ranked = leaderboard.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Done: indexed {ranked} ranked users."))
@@ -0,0 +1,70 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max, Q, Sum
+from django.db.models.functions import TruncDate
+
+from core.models import FlashcardAttempt, QuizAttempt, User, UserActiveDay, UserProgress, UserStats
+from core.streaks import user_timezone
+
+
+class Command(BaseCommand):
+    help = "Recompute UserProgress, active days and streaks from the raw quiz and flashcard attempts."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, dest='user_ids', action='append', help="Only rebuild this user id (repeatable).")
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('id')
+        if options['user_ids']:
+            users = users.filter(id__in=options['user_ids'])
+
+        rebuilt = 0
+        for user in users.iterator():
+            self.rebuild(user)
+            rebuilt += 1
+        self.stdout.write(self.style.SUCCESS(f"Done: rebuilt progress for {rebuilt} users."))
+
+    def rebuild(self, user):
+        quiz = QuizAttempt.objects.filter(user=user).aggregate(
+            count=Count('id'), score_sum=Sum('score'), last=Max('attempted_at')
+        )
+        flashcards = FlashcardAttempt.objects.filter(user=user).aggregate(
+            count=Count('id'), correct=Count('id', filter=Q(correct=True)), last=Max('reviewed_at')
+        )
+        tz = user_timezone(user)
+        days = set(
+            QuizAttempt.objects.filter(user=user).annotate(day=TruncDate('attempted_at', tzinfo=tz))
+            .values_list('day', flat=True).distinct()
+        ) | set(
+            FlashcardAttempt.objects.filter(user=user).annotate(day=TruncDate('reviewed_at', tzinfo=tz))
+            .values_list('day', flat=True).distinct()
+        )
+        with transaction.atomic():
+            UserActiveDay.objects.filter(user=user).delete()
+            UserActiveDay.objects.bulk_create([UserActiveDay(user=user, date=day) for day in days])
+            UserProgress.objects.update_or_create(user=user, defaults={
+                'quiz_attempts': quiz['count'],
+                'quiz_score_sum': quiz['score_sum'] or 0,
+                'flashcard_attempts': flashcards['count'],
+                'flashcard_correct': flashcards['correct'],
+                'active_days': len(days),
+            })
+            current, longest = self.streaks(sorted(days))
+            UserStats.objects.update_or_create(user=user, defaults={
+                'current_streak': current,
+                'longest_streak': longest,
+                'last_activity': max(filter(None, [quiz['last'], flashcards['last']]), default=None),
+            })
+
+    @staticmethod
+    def streaks(days):
+        """(streak ending on the last active day, longest streak) for sorted dates."""
+        current = longest = 0
+        previous = None
+        for day in days:
+            current = current + 1 if previous is not None and day == previous + timedelta(days=1) else 1
+            longest = max(longest, current)
+            previous = day
+        return current, longest
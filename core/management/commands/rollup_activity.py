@@ -0,0 +1,46 @@
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from core.models import ActivityDaily, ActivityLog
+
+
+class Command(BaseCommand):
+    help = "Aggregate ActivityLog events into per-user, per-day ActivityDaily counters (UTC days)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=2, help="Recompute this many most recent days, today included (default 2).")
+        parser.add_argument('--since', help="Recompute every day from this date (YYYY-MM-DD) instead.")
+
+    def handle(self, *args, **options):
+        today = timezone.now().date()
+        if options['since']:
+            try:
+                start = datetime.strptime(options['since'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError("--since must be a date in YYYY-MM-DD format.")
+        else:
+            if options['days'] < 1:
+                raise CommandError("--days must be at least 1.")
+            start = today - timedelta(days=options['days'] - 1)
+
+        # Whole days are recomputed, so rerunning (or overlapping runs) is safe.
+        counts = (
+            ActivityLog.objects.filter(timestamp__gte=datetime.combine(start, time.min, tzinfo=dt_timezone.utc))
+            .annotate(date=TruncDate('timestamp', tzinfo=dt_timezone.utc))
+            .values('user_id', 'date', 'activity_type')
+            .annotate(count=Count('id'))
+            .order_by()
+        )
+        rows = [
+            ActivityDaily(user_id=row['user_id'], date=row['date'], activity_type=row['activity_type'], count=row['count'])
+            for row in counts.iterator()
+        ]
+        with transaction.atomic():
+            ActivityDaily.objects.filter(date__gte=start).delete()
+            ActivityDaily.objects.bulk_create(rows, batch_size=1000)
+        self.stdout.write(self.style.SUCCESS(f"Done: {len(rows)} daily counters from {start} to {today}."))
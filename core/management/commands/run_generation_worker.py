@@ -0,0 +1,56 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from core import jobs
+
+
+def _run_in_thread(job):
+    try:
+        jobs.run_job(job)
+    finally:
+        # Each pool thread holds its own DB connection; don't leak them.
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = "Run queued AI generation jobs on a thread pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=getattr(settings, 'GENERATION_WORKER_THREADS', 4))
+        parser.add_argument('--poll-interval', type=float, default=1.0, help="Seconds to sleep when the queue is empty.")
+        parser.add_argument(
+            '--stale-after', type=int, default=None,
+            help="Requeue jobs left running for this many seconds (default: AI_RATE_LIMIT JOB_MAX_WAIT plus a generation margin).",
+        )
+        parser.add_argument('--once', action='store_true', help="Exit once the queue is drained.")
+
+    def handle(self, *args, **options):
+        threads = options['threads']
+        stale_after = options['stale_after']
+        requeued = jobs.requeue_stale_jobs(timedelta(seconds=stale_after) if stale_after is not None else None)
+        if requeued:
+            self.stdout.write(f"Requeued {requeued} stale job(s).")
+        self.stdout.write(f"Generation worker started with {threads} thread(s).")
+
+        in_flight = set()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            try:
+                while True:
+                    in_flight = {f for f in in_flight if not f.done()}
+                    close_old_connections()
+                    claimed = jobs.claim_jobs(threads - len(in_flight))
+                    for job in claimed:
+                        self.stdout.write(f"Running {job.kind} job {job.id}")
+                        in_flight.add(executor.submit(_run_in_thread, job))
+                    if claimed:
+                        continue
+                    if options['once'] and not in_flight:
+                        break
+                    time.sleep(options['poll_interval'])
+            except KeyboardInterrupt:
+                self.stdout.write("Stopping; waiting for running jobs to finish.")
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_generationjob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='generationjob',
+            name='kind',
+            field=models.CharField(choices=[('quiz', 'Quiz'), ('flashcards', 'Flashcards'), ('study_set', 'Study Set'), ('note', 'Note')], max_length=20),
+        ),
+    ]
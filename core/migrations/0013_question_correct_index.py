@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_generationjob_notebook'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='correct_index',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+    ]
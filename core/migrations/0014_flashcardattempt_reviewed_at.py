@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:42
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_question_correct_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='flashcardattempt',
+            name='reviewed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_pointsrollup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='flashcardattempt',
+            index=models.Index(fields=['user', 'flashcard', 'reviewed_at'], name='core_flashc_user_id_b0af2c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quizattempt',
+            index=models.Index(fields=['user', 'quiz', 'attempted_at'], name='core_quizat_user_id_9fe0c7_idx'),
+        ),
+    ]
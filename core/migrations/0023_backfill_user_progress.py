@@ -0,0 +1,76 @@
+from datetime import timedelta
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Count, Max, Q, Sum
+from django.db.models.functions import TruncDate
+
+
+def longest_and_current(days):
+    """(streak ending on the last active day, longest streak) for sorted dates."""
+    current = longest = 0
+    previous = None
+    for day in days:
+        current = current + 1 if previous is not None and day == previous + timedelta(days=1) else 1
+        longest = max(longest, current)
+        previous = day
+    return current, longest
+
+
+def backfill(apps, schema_editor):
+    """Build UserProgress, active days and streaks from attempts saved before they were tracked."""
+    User = apps.get_model('core', 'User')
+    QuizAttempt = apps.get_model('core', 'QuizAttempt')
+    FlashcardAttempt = apps.get_model('core', 'FlashcardAttempt')
+    UserProgress = apps.get_model('core', 'UserProgress')
+    UserActiveDay = apps.get_model('core', 'UserActiveDay')
+    UserStats = apps.get_model('core', 'UserStats')
+
+    quiz = {
+        row['user_id']: row for row in QuizAttempt.objects.values('user_id')
+        .annotate(count=Count('id'), score_sum=Sum('score'), last=Max('attempted_at')).order_by()
+    }
+    flashcards = {
+        row['user_id']: row for row in FlashcardAttempt.objects.values('user_id')
+        .annotate(count=Count('id'), correct=Count('id', filter=Q(correct=True)), last=Max('reviewed_at')).order_by()
+    }
+
+    for user in User.objects.filter(id__in=set(quiz) | set(flashcards)).iterator():
+        tz = ZoneInfo(user.timezone or settings.TIME_ZONE)
+        days = set(
+            QuizAttempt.objects.filter(user=user).annotate(day=TruncDate('attempted_at', tzinfo=tz))
+            .values_list('day', flat=True).distinct()
+        ) | set(
+            FlashcardAttempt.objects.filter(user=user).annotate(day=TruncDate('reviewed_at', tzinfo=tz))
+            .values_list('day', flat=True).distinct()
+        )
+        q = quiz.get(user.id, {})
+        f = flashcards.get(user.id, {})
+
+        UserActiveDay.objects.filter(user=user).delete()
+        UserActiveDay.objects.bulk_create([UserActiveDay(user=user, date=day) for day in days])
+        UserProgress.objects.update_or_create(user=user, defaults={
+            'quiz_attempts': q.get('count', 0),
+            'quiz_score_sum': q.get('score_sum') or 0,
+            'flashcard_attempts': f.get('count', 0),
+            'flashcard_correct': f.get('correct', 0),
+            'active_days': len(days),
+        })
+        current, longest = longest_and_current(sorted(days))
+        UserStats.objects.update_or_create(user=user, defaults={
+            'current_streak': current,
+            'longest_streak': longest,
+            'last_activity': max(filter(None, [q.get('last'), f.get('last')]), default=None),
+        })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_chatmessage_keyset_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+from django.db import migrations
+from django.db.models import Exists, OuterRef
+
+DEFAULT_EASE = 2.5
+BATCH_SIZE = 2000
+
+
+def backfill(apps, schema_editor):
+    """Give every flashcard its owner never reviewed a ReviewState due when its note was created."""
+    Flashcard = apps.get_model('core', 'Flashcard')
+    ReviewState = apps.get_model('core', 'ReviewState')
+
+    unscheduled = Flashcard.objects.exclude(
+        Exists(ReviewState.objects.filter(user_id=OuterRef('note__notebook__user_id'), flashcard=OuterRef('pk')))
+    ).values_list('id', 'note__notebook__user_id', 'note__created_at').order_by('id')
+
+    batch = []
+    for card_id, user_id, created_at in unscheduled.iterator(chunk_size=BATCH_SIZE):
+        batch.append(ReviewState(user_id=user_id, flashcard_id=card_id, ease=DEFAULT_EASE, due_at=created_at))
+        if len(batch) >= BATCH_SIZE:
+            ReviewState.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    ReviewState.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0023_backfill_user_progress'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
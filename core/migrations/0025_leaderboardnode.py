@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0024_backfill_new_card_review_states'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardNode',
+            fields=[
+                ('node', models.PositiveIntegerField(primary_key=True, serialize=False)),
+                ('users', models.IntegerField(default=0)),
+            ],
+        ),
+    ]
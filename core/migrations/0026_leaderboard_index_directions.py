@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0025_leaderboardnode'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='pointsrollup',
+            name='core_points_period_8228f6_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='userstats',
+            name='core_userst_total_p_f8afaf_idx',
+        ),
+        migrations.AddIndex(
+            model_name='pointsrollup',
+            index=models.Index(fields=['period', 'period_start', '-points', 'user'], name='core_points_period_f35ce9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userstats',
+            index=models.Index(fields=['-total_points', 'user'], name='core_userst_total_p_b754de_idx'),
+        ),
+    ]
@@ -1,10 +1,11 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import AbstractUser
 import uuid
 
 class User(AbstractUser):
     # Extend as needed later (profile pic, bio, etc.)
-    pass
+    timezone = models.CharField(max_length=64, blank=True, default='')  # IANA name; blank means settings.TIME_ZONE
 
 class Notebook(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -28,6 +29,13 @@ class Flashcard(models.Model):
     question = models.TextField()
     answer = models.TextField()
 
+    def save(self, *args, **kwargs):
+        from .scheduler import schedule_new_cards
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        if adding:
+            schedule_new_cards([self])
+
 class Quiz(models.Model):
     note = models.ForeignKey(Note, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -37,6 +45,12 @@ class Question(models.Model):
     question = models.TextField()
     options = models.JSONField()  # Requires PostgreSQL
     correct = models.CharField(max_length=255)
+    correct_index = models.PositiveSmallIntegerField(null=True, blank=True)  # resolved from `correct`; see core.grading
+
+    def save(self, *args, **kwargs):
+        from .grading import resolve_correct_index
+        self.correct_index = resolve_correct_index(self.correct, self.options)
+        super().save(*args, **kwargs)
 
 class StudyGroup(models.Model):
     name = models.CharField(max_length=255)
@@ -150,7 +164,9 @@ class ChatMessage(models.Model):
     resource_title = models.CharField(max_length=255, blank=True, null=True)
     
     class Meta:
-        ordering = ['created_at']
+        ordering = ['created_at', 'id']
+        # Keyset pagination of a group's history (core.pagination).
+        indexes = [models.Index(fields=['group', 'created_at', 'id'])]
     
     def __str__(self):
         return f"{self.user.username}: {self.message[:50]}"
@@ -218,6 +234,9 @@ class QuizAttempt(models.Model):
     answers = models.JSONField()
     attempted_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['user', 'quiz', 'attempted_at'])]
+
     def __str__(self):
         return f"{self.user.username} attempted Quiz {self.quiz.id} at {self.attempted_at}" 
 
@@ -225,7 +244,10 @@ class FlashcardAttempt(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     flashcard = models.ForeignKey(Flashcard, on_delete=models.CASCADE)
     correct = models.BooleanField(null=True, blank=True)
-    reviewed_at = models.DateTimeField(auto_now_add=True)
+    reviewed_at = models.DateTimeField(default=timezone.now)  # client time for offline review sessions
+
+    class Meta:
+        indexes = [models.Index(fields=['user', 'flashcard', 'reviewed_at'])]
 
     def __str__(self):
         return f"{self.user.username} reviewed Flashcard {self.flashcard.id} at {self.reviewed_at}"
@@ -237,6 +259,9 @@ class UserStats(models.Model):
     longest_streak = models.IntegerField(default=0)
     last_activity = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['-total_points', 'user'])]  # leaderboard order (either direction) and neighbours
+
     def __str__(self):
         return f"Stats for {self.user.username}"
 
@@ -251,8 +276,125 @@ class ActivityLog(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     activity_type = models.CharField(max_length=20, choices=ACTIVITY_TYPES)
     object_id = models.IntegerField(null=True, blank=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set when the event happens, not when core.activity flushes it.
+    timestamp = models.DateTimeField(default=timezone.now)
     details = models.JSONField(null=True, blank=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['timestamp'])]
+
     def __str__(self):
         return f"{self.user.username} {self.activity_type} at {self.timestamp}"
+
+class ActivityDaily(models.Model):
+    """ActivityLog events per user, UTC date and type, built by `manage.py rollup_activity`."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='activity_days')
+    date = models.DateField()
+    activity_type = models.CharField(max_length=20, choices=ActivityLog.ACTIVITY_TYPES)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('user', 'date', 'activity_type')
+
+    def __str__(self):
+        return f"{self.user.username} {self.activity_type} x{self.count} on {self.date}"
+
+# --- Background AI Generation ---
+
+class GenerationJob(models.Model):
+    KIND_CHOICES = [
+        ('quiz', 'Quiz'),
+        ('flashcards', 'Flashcards'),
+        ('study_set', 'Study Set'),
+        ('notebook', 'Notebook'),
+        ('note', 'Note'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    ]
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='generation_jobs')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    params = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    result = models.JSONField(null=True, blank=True)  # ids of the created Quiz/Flashcards/Note
+    error = models.JSONField(null=True, blank=True)
+    error_status = models.IntegerField(null=True, blank=True)  # HTTP status the sync endpoint would return
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'created_at'])]
+
+    def __str__(self):
+        return f"{self.kind} job {self.id} ({self.status})"
+
+# --- Spaced Repetition ---
+class ReviewState(models.Model):
+    """SM-2 scheduling state for one user's reviews of one flashcard; see core.scheduler."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='review_states')
+    flashcard = models.ForeignKey(Flashcard, on_delete=models.CASCADE, related_name='review_states')
+    ease = models.FloatField(default=2.5)
+    interval_days = models.IntegerField(default=0)
+    repetitions = models.IntegerField(default=0)  # consecutive successful reviews
+    due_at = models.DateTimeField()
+    last_reviewed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ('user', 'flashcard')
+        indexes = [models.Index(fields=['user', 'due_at'])]
+
+    def __str__(self):
+        return f"{self.user.username} / Flashcard {self.flashcard_id} due {self.due_at}"
+
+# --- Progress Aggregates ---
+class UserProgress(models.Model):
+    """Running totals behind get_user_progress, kept current by core.progress."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='progress')
+    quiz_attempts = models.IntegerField(default=0)
+    quiz_score_sum = models.FloatField(default=0)
+    flashcard_attempts = models.IntegerField(default=0)
+    flashcard_correct = models.IntegerField(default=0)
+    active_days = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"Progress for {self.user.username}"
+
+class UserActiveDay(models.Model):
+    """One row per (user, local date) with at least one quiz or flashcard attempt."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='active_days')
+    date = models.DateField()
+
+    class Meta:
+        unique_together = ('user', 'date')
+
+# --- Leaderboard Rollups ---
+class PointsRollup(models.Model):
+    """Points a user earned in one week or month, kept current by core.rollups."""
+    PERIOD_CHOICES = [
+        ('week', 'Week'),
+        ('month', 'Month'),
+    ]
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='points_rollups')
+    period = models.CharField(max_length=5, choices=PERIOD_CHOICES)
+    period_start = models.DateField()
+    points = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('user', 'period', 'period_start')
+        indexes = [models.Index(fields=['period', 'period_start', '-points', 'user'])]  # one period's standings, in order
+
+    def __str__(self):
+        return f"{self.user.username}: {self.points} points ({self.period} of {self.period_start})"
+
+class LeaderboardNode(models.Model):
+    """One node of the Fenwick tree counting users per point bucket; see core.leaderboard."""
+    node = models.PositiveIntegerField(primary_key=True)
+    users = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"Leaderboard node {self.node}: {self.users} users"
@@ -0,0 +1,60 @@
+"""
+Keyset (cursor) pagination over (created_at, id).
+
+A cursor names one row by its (created_at, id) pair, so a page is a range
+scan that starts at the cursor on a (..., created_at, id) index: the cost of
+a page doesn't depend on how many rows come before or after it, unlike
+OFFSET. Cursors are opaque URL-safe strings.
+"""
+import base64
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+def encode_cursor(row):
+    raw = json.dumps([row.created_at.isoformat(), row.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(value):
+    """(created_at, id) from a cursor; ValueError if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(value + '=' * (-len(value) % 4))
+        created_at, row_id = json.loads(raw)
+        moment = parse_datetime(created_at)
+        if moment is None or not isinstance(row_id, int):
+            raise ValueError
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    return moment, row_id
+
+
+def keyset_page(queryset, limit, before=None, after=None):
+    """
+    One page of queryset in (created_at, id) order, oldest first.
+
+    With `after`, the `limit` rows following that cursor; otherwise the
+    `limit` rows preceding `before` (the latest rows when it is None).
+    Returns (rows, has_more), has_more meaning more rows lie beyond the page
+    in the direction paged: newer for `after`, older otherwise.
+    """
+    if after is not None:
+        created_at, row_id = decode_cursor(after)
+        rows = list(
+            queryset.filter(created_at__gte=created_at)
+            .filter(Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=row_id))
+            .order_by('created_at', 'id')[:limit + 1]
+        )
+        return rows[:limit], len(rows) > limit
+
+    if before is not None:
+        created_at, row_id = decode_cursor(before)
+        # The plain range bound lets the index scan start at the cursor.
+        queryset = (
+            queryset.filter(created_at__lte=created_at)
+            .filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=row_id))
+        )
+    rows = list(queryset.order_by('-created_at', '-id')[:limit + 1])
+    return list(reversed(rows[:limit])), len(rows) > limit
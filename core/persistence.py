@@ -0,0 +1,65 @@
+"""
+Batched, atomic persistence for AI-generated quizzes and flashcards.
+
+A whole generation is written in one transaction with a fixed number of
+INSERTs (one per table) no matter how many items or notes it covers, so a
+failure part-way never leaves a partial quiz behind.
+"""
+from django.db import transaction
+
+from .grading import resolve_correct_index
+from .models import Flashcard, Quiz, Question
+from .scheduler import schedule_new_cards
+
+
+def save_quizzes(entries):
+    """entries: [(note, quiz_items)]. Returns the created Quiz objects in order."""
+    entries = list(entries)
+    if not entries:
+        return []
+    with transaction.atomic():
+        quizzes = Quiz.objects.bulk_create([Quiz(note=note) for note, _ in entries])
+        Question.objects.bulk_create([
+            Question(
+                quiz=quiz,
+                question=q['question'],
+                options=q['options'],
+                correct=q['correct'],
+                correct_index=resolve_correct_index(q['correct'], q['options'])
+            )
+            for quiz, (_, quiz_data) in zip(quizzes, entries)
+            for q in quiz_data
+        ])
+    return quizzes
+
+
+def save_flashcard_sets(entries):
+    """entries: [(note, flashcard_items)]. Returns one list of Flashcards per entry."""
+    entries = list(entries)
+    if not entries:
+        return []
+    with transaction.atomic():
+        flashcards = Flashcard.objects.bulk_create([
+            Flashcard(
+                note=note,
+                question=fc['question'],
+                answer=fc['answer']
+            )
+            for note, flashcard_data in entries
+            for fc in flashcard_data
+        ])
+        schedule_new_cards(flashcards)
+    sets = []
+    offset = 0
+    for _, flashcard_data in entries:
+        sets.append(flashcards[offset:offset + len(flashcard_data)])
+        offset += len(flashcard_data)
+    return sets
+
+
+def save_quiz(note, quiz_data):
+    return save_quizzes([(note, quiz_data)])[0]
+
+
+def save_flashcards(note, flashcard_data):
+    return save_flashcard_sets([(note, flashcard_data)])[0]
@@ -0,0 +1,33 @@
+"""
+Points accounting.
+
+Points are added with a single atomic `UPDATE ... SET total_points =
+total_points + n`, so concurrent submissions never lose each other's
+updates and the row lock is held only for that one statement. The
+weekly/monthly rollups are bumped the same way, and the leaderboard rank
+index is moved in the same transaction.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from . import leaderboard, rollups
+from .models import UserStats
+
+
+def award_points(user, points):
+    """Add points to user's total, creating their UserStats row if needed."""
+    if not points:
+        return 0
+    if not UserStats.objects.filter(user=user).update(total_points=F('total_points') + points):
+        try:
+            # First points for this user; the savepoint lets a racing create win cleanly.
+            with transaction.atomic():
+                UserStats.objects.create(user=user, total_points=points)
+        except IntegrityError:
+            UserStats.objects.filter(user=user).update(total_points=F('total_points') + points)
+
+    # Our UPDATE holds the row lock, so this is exactly the total it produced.
+    new_total = UserStats.objects.filter(user=user).values_list('total_points', flat=True).get()
+    leaderboard.record_change(new_total - points, new_total)
+    rollups.record_points(user, points)
+    return points
@@ -0,0 +1,58 @@
+"""
+Per-user progress aggregates.
+
+UserProgress holds counts and sums that are bumped with F() increments in
+the same transaction that saves the attempts, so reading a user's progress
+is a single-row lookup. Distinct active days (in the user's time zone) are
+tracked through UserActiveDay, whose unique (user, date) row tells us
+whether a day is new; streaks are updated alongside (see core.streaks).
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from . import streaks
+from .models import UserActiveDay, UserProgress
+
+
+def _bump(user, **deltas):
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    updates = {field: F(field) + delta for field, delta in deltas.items()}
+    if UserProgress.objects.filter(user=user).update(**updates):
+        return
+    try:
+        with transaction.atomic():
+            UserProgress.objects.create(user=user, **deltas)
+    except IntegrityError:
+        UserProgress.objects.filter(user=user).update(**updates)
+
+
+def _mark_active(user, timestamps):
+    streaks.record_activity(user, timestamps)
+    tz = streaks.user_timezone(user)
+    new_days = 0
+    for day in {streaks.local_date(timestamp, tz) for timestamp in timestamps}:
+        _, created = UserActiveDay.objects.get_or_create(user=user, date=day)
+        new_days += created
+    return new_days
+
+
+def record_quiz_attempts(user, attempts):
+    """Fold newly saved QuizAttempts into user's progress. Call inside the saving transaction."""
+    _bump(
+        user,
+        quiz_attempts=len(attempts),
+        quiz_score_sum=sum(attempt.score for attempt in attempts),
+        active_days=_mark_active(user, [attempt.attempted_at for attempt in attempts])
+    )
+
+
+def record_flashcard_attempts(user, attempts):
+    """Fold newly saved FlashcardAttempts into user's progress. Call inside the saving transaction."""
+    _bump(
+        user,
+        flashcard_attempts=len(attempts),
+        flashcard_correct=sum(1 for attempt in attempts if attempt.correct is True),
+        active_days=_mark_active(user, [attempt.reviewed_at for attempt in attempts])
+    )
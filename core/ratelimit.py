@@ -0,0 +1,368 @@
+"""
+Proactive limits in front of every LLM call.
+
+A global token bucket caps total request rate, per-user buckets stop one
+user from using it all, and a circuit breaker fails fast for a cool-down
+window after repeated upstream errors, then lets a single trial call
+through. State lives in a Django cache (settings.AI_RATE_LIMIT['CACHE'])
+so every gunicorn worker shares one budget. A bucket entry expires once the
+bucket would be full again, so idle users' buckets don't accumulate.
+
+Every call is charged to the acting user. Interactive requests fail
+fast; background jobs run inside waiting(), where acquire() sleeps until
+capacity returns (up to a deadline) instead of failing. A batch of calls
+(a notebook, the chunks of a long note, top-up rounds) runs inside
+reserve(), which takes the user's tokens for the whole batch in one step,
+so it is refused before any call is made rather than cut off midway.
+"""
+import contextvars
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .locks import cache_lock
+
+DEFAULTS = {
+    'CACHE': 'default',
+    'GLOBAL_CAPACITY': 15,
+    'GLOBAL_REFILL_PER_MINUTE': 15,
+    'USER_CAPACITY': 5,
+    'USER_REFILL_PER_MINUTE': 5,
+    'BREAKER_THRESHOLD': 5,
+    'BREAKER_COOLDOWN': 60,
+    'JOB_MAX_WAIT': 900,    # seconds a background job may wait for capacity
+}
+
+LOCK_TIMEOUT = 2  # seconds a crashed holder can block others
+LOCK_WAIT = 0.5
+
+HALF_OPEN_POLL = 1.0  # retry_after given to callers while another runs the trial call
+
+_current_user_id = contextvars.ContextVar('ai_rate_limit_user_id', default=None)
+_wait_until = contextvars.ContextVar('ai_rate_limit_wait_until', default=None)
+_reservation = contextvars.ContextVar('ai_rate_limit_reservation', default=None)
+
+
+class RateLimitExceeded(Exception):
+    def __init__(self, scope, retry_after):
+        self.scope = scope
+        self.retry_after = retry_after
+        super().__init__(f"AI rate limit reached ({scope}); retry in {retry_after:.0f}s")
+
+    def __reduce__(self):
+        return type(self), (self.scope, self.retry_after)
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, retry_after):
+        self.retry_after = retry_after
+        super().__init__(f"AI service circuit open; retry in {retry_after:.0f}s")
+
+    def __reduce__(self):
+        return type(self), (self.retry_after,)
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'AI_RATE_LIMIT', {})}
+
+
+def _cache():
+    return caches[get_config()['CACHE']]
+
+
+@contextmanager
+def _locked(key):
+    """
+    Best-effort cross-process mutex. If the lock cannot be taken within
+    LOCK_WAIT the caller proceeds anyway: a slightly over-spent budget is
+    better than stalling requests on a stuck lock.
+    """
+    with cache_lock(_cache(), key, LOCK_TIMEOUT, LOCK_WAIT):
+        yield
+
+
+class TokenBucket:
+    def __init__(self, key, capacity, refill_per_minute):
+        self.key = key
+        self.capacity = capacity
+        self.rate = refill_per_minute / 60.0
+
+    def _refilled(self, state, now):
+        if state is None:
+            return float(self.capacity)
+        elapsed = max(0.0, now - state['updated'])
+        return min(float(self.capacity), state['tokens'] + elapsed * self.rate)
+
+    def _save(self, cache, tokens, now):
+        # A missing entry reads as a full bucket, so the entry only has to
+        # outlive the time it takes to refill.
+        timeout = max(1, math.ceil((self.capacity - tokens) / self.rate)) if self.rate else None
+        cache.set(self.key, {'tokens': tokens, 'updated': now}, timeout)
+
+    def try_acquire(self):
+        """Take one token; return 0 on success or the seconds until one is available."""
+        return self.take_up_to(1, 1)[1]
+
+    def take_up_to(self, count, minimum):
+        """
+        Take as many whole tokens as there are, up to count; return (taken, 0),
+        or (0, seconds until `minimum` are available) if there are fewer.
+        """
+        cache = _cache()
+        with _locked(self.key):
+            now = time.time()
+            tokens = self._refilled(cache.get(self.key), now)
+            taken = min(count, int(tokens))
+            if taken >= minimum:
+                self._save(cache, tokens - taken, now)
+                return taken, 0
+            self._save(cache, tokens, now)
+        return 0, (minimum - tokens) / self.rate if self.rate else float('inf')
+
+    def refund(self, count=1):
+        cache = _cache()
+        with _locked(self.key):
+            now = time.time()
+            tokens = self._refilled(cache.get(self.key), now)
+            self._save(cache, min(float(self.capacity), tokens + count), now)
+
+    def snapshot(self):
+        return {
+            'tokens': round(self._refilled(_cache().get(self.key), time.time()), 2),
+            'capacity': self.capacity,
+            'refill_per_minute': self.rate * 60,
+        }
+
+
+class CircuitBreaker:
+    key = 'ai:breaker'
+    trial_key = 'ai:breaker:trial'
+
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+
+    def _state(self):
+        return _cache().get(self.key) or {'failures': 0, 'opened_until': 0}
+
+    def check(self):
+        """Raise CircuitOpenError unless a call may go ahead; True if it is the half-open trial."""
+        state = self._state()
+        now = time.time()
+        if state['opened_until'] > now:
+            raise CircuitOpenError(state['opened_until'] - now)
+        # Half-open: exactly one caller gets the trial call; its outcome
+        # closes or re-opens the circuit. The slot expires if it never reports.
+        if state['failures'] < self.threshold:
+            return False
+        if not _cache().add(self.trial_key, True, self.cooldown):
+            raise CircuitOpenError(HALF_OPEN_POLL)
+        return True
+
+    def release_trial(self):
+        """Give up the trial slot without a call having been made."""
+        _cache().delete(self.trial_key)
+
+    def record_success(self):
+        if self._state()['failures']:
+            _cache().set(self.key, {'failures': 0, 'opened_until': 0}, None)
+            _cache().delete(self.trial_key)
+
+    def record_failure(self):
+        with _locked(self.key):
+            state = self._state()
+            state['failures'] += 1
+            if state['failures'] >= self.threshold:
+                # Also re-opens immediately when the half-open trial call fails.
+                state['opened_until'] = time.time() + self.cooldown
+            _cache().set(self.key, state, None)
+        _cache().delete(self.trial_key)
+
+    def snapshot(self):
+        state = self._state()
+        remaining = max(0.0, state['opened_until'] - time.time())
+        return {
+            'state': 'open' if remaining else ('half_open' if state['failures'] >= self.threshold else 'closed'),
+            'consecutive_failures': state['failures'],
+            'threshold': self.threshold,
+            'cooldown_seconds': self.cooldown,
+            'retry_after': round(remaining, 1),
+        }
+
+
+def global_bucket():
+    config = get_config()
+    return TokenBucket('ai:bucket:global', config['GLOBAL_CAPACITY'], config['GLOBAL_REFILL_PER_MINUTE'])
+
+
+def user_bucket(user_id):
+    config = get_config()
+    return TokenBucket(f'ai:bucket:user:{user_id}', config['USER_CAPACITY'], config['USER_REFILL_PER_MINUTE'])
+
+
+def breaker():
+    config = get_config()
+    return CircuitBreaker(config['BREAKER_THRESHOLD'], config['BREAKER_COOLDOWN'])
+
+
+@contextmanager
+def acting_user(user_id):
+    """Charge LLM calls made inside the block to user_id's bucket."""
+    token = _current_user_id.set(user_id)
+    try:
+        yield
+    finally:
+        _current_user_id.reset(token)
+
+
+@contextmanager
+def waiting(max_wait):
+    """
+    Inside the block acquire() waits up to max_wait seconds for capacity
+    instead of raising. An enclosing block with a later deadline wins.
+    """
+    deadline = time.time() + max_wait
+    current = _wait_until.get()
+    token = _wait_until.set(max(deadline, current or 0))
+    try:
+        yield
+    finally:
+        _wait_until.reset(token)
+
+
+def _retrying(attempt):
+    """Call attempt(), sleeping out its retry_after while the waiting() deadline allows."""
+    while True:
+        try:
+            return attempt()
+        except (RateLimitExceeded, CircuitOpenError) as e:
+            deadline = _wait_until.get()
+            if deadline is None or time.time() + e.retry_after > deadline:
+                raise
+            time.sleep(e.retry_after)
+
+
+def user_capacity():
+    """Most calls one reservation can cover; larger batches belong in a background job."""
+    return get_config()['USER_CAPACITY']
+
+
+class _Reservation:
+    """User tokens taken up front for a batch; calls draw on them before charging the bucket."""
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.tokens = 0
+        self._lock = threading.Lock()
+
+    def take(self):
+        with self._lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+    def give_back(self, count=1):
+        with self._lock:
+            self.tokens += count
+
+    def shortfall(self, calls):
+        with self._lock:
+            return max(0, min(calls, user_capacity()) - self.tokens)
+
+
+@contextmanager
+def reserve(calls, minimum=None):
+    """
+    Take the acting user's tokens for `calls` LLM calls in one step before
+    any of them is made. RateLimitExceeded is raised unless at least
+    `minimum` (default: all) are there; inside waiting() it waits for them.
+    Calls inside the block use the reserved tokens first and are charged
+    one by one after that; unused tokens are refunded on exit.
+
+    At most user_capacity() tokens are held. A nested reserve() tops up
+    the enclosing reservation instead of starting its own.
+    """
+    user_id = _current_user_id.get()
+    if user_id is None:
+        yield
+        return
+    outer = _reservation.get()
+    reservation = outer if outer is not None and outer.user_id == user_id else _Reservation(user_id)
+    need = reservation.shortfall(calls)
+    if need:
+        least = need if minimum is None else min(need, max(0, minimum - reservation.tokens))
+
+        def attempt():
+            taken, retry_after = user_bucket(user_id).take_up_to(need, least)
+            if retry_after:
+                raise RateLimitExceeded('user', retry_after)
+            return taken
+
+        reservation.give_back(_retrying(attempt))
+    if reservation is outer:
+        yield
+        return
+    token = _reservation.set(reservation)
+    try:
+        yield
+    finally:
+        _reservation.reset(token)
+        if reservation.tokens:
+            user_bucket(user_id).refund(reservation.tokens)
+
+
+def acquire():
+    """
+    Reserve capacity for one LLM call, raising CircuitOpenError or
+    RateLimitExceeded instead of letting the call hit the upstream limit
+    (after waiting for capacity, inside waiting()).
+    """
+    return _retrying(_try_acquire)
+
+
+def _try_acquire():
+    circuit = breaker()
+    trial = circuit.check()
+    user_id = _current_user_id.get()
+    reservation = _reservation.get()
+    prepaid = reservation is not None and reservation.user_id == user_id and reservation.take()
+    retry_after = user_bucket(user_id).try_acquire() if user_id is not None and not prepaid else 0
+    scope = 'user'
+    if not retry_after:
+        retry_after = global_bucket().try_acquire()
+        scope = 'global'
+        if retry_after and prepaid:
+            reservation.give_back()
+        elif retry_after and user_id is not None:
+            user_bucket(user_id).refund()
+    if retry_after:
+        if trial:
+            circuit.release_trial()
+        raise RateLimitExceeded(scope, retry_after)
+
+
+def guarded(call):
+    """Run call() under the limiter, feeding its outcome to the circuit breaker."""
+    acquire()
+    try:
+        result = call()
+    except Exception:
+        breaker().record_failure()
+        raise
+    breaker().record_success()
+    return result
+
+
+def snapshot(user_id=None):
+    data = {
+        'global': global_bucket().snapshot(),
+        'circuit_breaker': breaker().snapshot(),
+    }
+    if user_id is not None:
+        data['user'] = dict(user_bucket(user_id).snapshot(), user_id=user_id)
+    return data
@@ -0,0 +1,86 @@
+"""
+Weekly and monthly points rollups for time-windowed leaderboards.
+
+award_points adds to the user's PointsRollup row for the current week
+(starting Monday, UTC) and month with F() increments, so a period
+leaderboard is an index scan over one period's rows rather than an
+aggregate over raw attempts. Rows older than the configured retention are
+deleted the first time anyone earns points in a new period.
+"""
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import PointsRollup
+
+PERIODS = ('week', 'month')
+DEFAULT_RETENTION = {'week': 8, 'month': 12}  # periods kept, including the current one
+
+
+def _config():
+    return getattr(settings, 'LEADERBOARD', {})
+
+
+def period_start(period, day, periods_ago=0):
+    """First day of the week (Monday) or month containing day, shifted back periods_ago periods."""
+    if period == 'week':
+        return day - timedelta(days=day.weekday() + 7 * periods_ago)
+    month_index = day.year * 12 + day.month - 1 - periods_ago
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def current_start(period, periods_ago=0):
+    return period_start(period, timezone.now().date(), periods_ago)
+
+
+def record_points(user, points):
+    """Add points to user's rollups for the current week and month."""
+    if not points:
+        return
+    today = timezone.now().date()
+    for period in PERIODS:
+        start = period_start(period, today)
+        rows = PointsRollup.objects.filter(user=user, period=period, period_start=start)
+        if rows.update(points=F('points') + points):
+            continue
+        try:
+            with transaction.atomic():
+                PointsRollup.objects.create(user=user, period=period, period_start=start, points=points)
+        except IntegrityError:
+            rows.update(points=F('points') + points)
+        # First points of a period for this user: a new period may have begun.
+        transaction.on_commit(lambda period=period, start=start: prune(period, start))
+
+
+def prune(period, start):
+    """Delete rollups past retention, once per period across all workers."""
+    cache = caches[_config().get('CACHE', 'default')]
+    if not cache.add(f'rollup:pruned:{period}:{start.isoformat()}', True, 60 * 60 * 24 * 40):
+        return 0
+    keep = {**DEFAULT_RETENTION, **_config().get('ROLLUP_RETENTION', {})}[period]
+    oldest = period_start(period, start, keep - 1)
+    deleted, _ = PointsRollup.objects.filter(period=period, period_start__lt=oldest).delete()
+    return deleted
+
+
+def standings(period, start, limit, user_ids=None):
+    """Top rollups for one period, optionally restricted to a user id queryset/list."""
+    rows = PointsRollup.objects.select_related('user').filter(period=period, period_start=start, points__gt=0)
+    if user_ids is not None:
+        rows = rows.filter(user_id__in=user_ids)
+    return rows.order_by('-points', 'user_id')[:limit]
+
+
+def points_and_rank(user, period, start, user_ids=None):
+    """(points, rank) of user in one period, or (0, None) if they earned nothing."""
+    mine = PointsRollup.objects.filter(user=user, period=period, period_start=start).values_list('points', flat=True).first()
+    if not mine:
+        return 0, None
+    above = PointsRollup.objects.filter(period=period, period_start=start, points__gt=mine)
+    if user_ids is not None:
+        above = above.filter(user_id__in=user_ids)
+    return mine, above.count() + 1
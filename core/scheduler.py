@@ -0,0 +1,116 @@
+"""
+SM-2 spaced-repetition scheduling for flashcards.
+
+A flashcard gets a ReviewState for its owner when it is created, due at
+once, and every review updates the (user, flashcard) state in place, so the
+next cards to study, new or not, are simply the user's states with the
+earliest due_at. That is an index range scan on (user, due_at) and costs
+the same however many cards the user owns.
+"""
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .models import Flashcard, ReviewState
+
+DEFAULT_EASE = 2.5
+MIN_EASE = 1.3
+PASSING_QUALITY = 3
+CORRECT_QUALITY = 4  # "correct" without a finer self-rating
+INCORRECT_QUALITY = 2
+
+
+def quality_for(correct, quality=None):
+    """SM-2 quality (0-5) for an attempt, or None when it should not be scheduled."""
+    if quality is not None:
+        return quality
+    if correct is True:
+        return CORRECT_QUALITY
+    if correct is False:
+        return INCORRECT_QUALITY
+    return None  # card was only viewed
+
+
+def apply_review(state, quality, reviewed_at):
+    """Advance state by one review of the given quality (SM-2)."""
+    if quality < PASSING_QUALITY:
+        state.repetitions = 0
+        state.interval_days = 1
+    else:
+        state.repetitions += 1
+        if state.repetitions == 1:
+            state.interval_days = 1
+        elif state.repetitions == 2:
+            state.interval_days = 6
+        else:
+            state.interval_days = round(state.interval_days * state.ease)
+    miss = 5 - quality
+    state.ease = max(MIN_EASE, state.ease + 0.1 - miss * (0.08 + miss * 0.02))
+    state.last_reviewed_at = reviewed_at
+    state.due_at = reviewed_at + timedelta(days=state.interval_days)
+    return state
+
+
+def schedule_new_cards(flashcards, now=None):
+    """Give each newly created flashcard a ReviewState for its owner, due now."""
+    flashcards = list(flashcards)
+    if not flashcards:
+        return []
+    now = now or timezone.now()
+    owners = dict(
+        Flashcard.objects.filter(id__in=[card.id for card in flashcards]).values_list('id', 'note__notebook__user_id')
+    )
+    return ReviewState.objects.bulk_create([
+        ReviewState(user_id=owners[card.id], flashcard_id=card.id, ease=DEFAULT_EASE, due_at=now)
+        for card in flashcards
+    ], ignore_conflicts=True)
+
+
+def record_reviews(user, reviews):
+    """
+    Apply reviews, a list of (flashcard_id, quality, reviewed_at), to user's
+    review states with one read and at most two writes. Each card's reviews
+    are applied in reviewed_at order, and reviews no newer than the card's
+    last_reviewed_at (an offline session synced after later reviews) are
+    skipped so they cannot rewind its schedule.
+    """
+    reviews = sorted((review for review in reviews if review[1] is not None), key=lambda review: review[2])
+    if not reviews:
+        return []
+    states = {
+        state.flashcard_id: state
+        for state in ReviewState.objects.filter(user=user, flashcard_id__in={card_id for card_id, _, _ in reviews})
+    }
+    created = {}
+    changed = {}
+    for card_id, quality, reviewed_at in reviews:
+        state = states.get(card_id)
+        if state is None:
+            state = states[card_id] = created[card_id] = ReviewState(
+                user=user, flashcard_id=card_id, ease=DEFAULT_EASE, due_at=reviewed_at
+            )
+        elif state.last_reviewed_at is not None and reviewed_at <= state.last_reviewed_at:
+            continue  # older than a review already applied
+        apply_review(state, quality, reviewed_at)
+        changed[card_id] = state
+
+    ReviewState.objects.bulk_create(created.values())
+    ReviewState.objects.bulk_update(
+        [state for card_id, state in changed.items() if card_id not in created],
+        ['ease', 'interval_days', 'repetitions', 'due_at', 'last_reviewed_at']
+    )
+    return list(states.values())
+
+
+def due_cards(user, limit, include_new=True, now=None):
+    """
+    Up to `limit` cards to review now, most overdue first. Never-reviewed
+    cards are due from their creation, so they queue in creation order among
+    the others; include_new=False leaves them out.
+    Returns [(flashcard, review_state)].
+    """
+    now = now or timezone.now()
+    due = ReviewState.objects.filter(user=user, due_at__lte=now)
+    if not include_new:
+        due = due.filter(last_reviewed_at__isnull=False)
+    return [(state.flashcard, state) for state in due.select_related('flashcard').order_by('due_at', 'id')[:limit]]
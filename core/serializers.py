@@ -1,3 +1,5 @@
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
 from django.contrib.auth import get_user_model
 from rest_framework import serializers
 from .models import Notebook, Note, Flashcard, Quiz, Question, StudyGroup, GroupMembership, SharedNote, SharedQuiz, SharedFlashcard, SharedLink, ChatMessage, GroupResource, ResourceLike, GroupInvitation, QuizAttempt, ActivityLog, FlashcardAttempt
@@ -40,6 +42,7 @@ class QuestionSerializer(serializers.ModelSerializer):
     class Meta:
         model = Question
         fields = '__all__'
+        read_only_fields = ['correct_index']
 
 User = get_user_model()
 
@@ -61,9 +64,17 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
 class UserProfileSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
-        fields = ('id', 'username', 'email', 'first_name', 'last_name', 'is_superuser')
+        fields = ('id', 'username', 'email', 'first_name', 'last_name', 'is_superuser', 'timezone')
         read_only_fields = ('id', 'username', 'email', 'is_superuser')
 
+    def validate_timezone(self, value):
+        if value:
+            try:
+                ZoneInfo(value)
+            except (ZoneInfoNotFoundError, ValueError):
+                raise serializers.ValidationError("Unknown time zone.")
+        return value
+
 class StudyGroupSerializer(serializers.ModelSerializer):
     created_by = serializers.ReadOnlyField(source='created_by.username')
     class Meta:
@@ -187,7 +198,27 @@ class ActivityLogSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 class FlashcardAttemptSerializer(serializers.ModelSerializer):
+    # Optional SM-2 self-rating (0-5); defaults from `correct`. See core.scheduler.
+    quality = serializers.IntegerField(min_value=0, max_value=5, required=False, allow_null=True, write_only=True)
+
     class Meta:
         model = FlashcardAttempt
-        fields = ['id', 'user', 'flashcard', 'correct', 'reviewed_at']
-        read_only_fields = ['id', 'user', 'reviewed_at']
\ No newline at end of file
+        fields = ['id', 'user', 'flashcard', 'correct', 'quality', 'reviewed_at']
+        read_only_fields = ['id', 'user', 'reviewed_at']
+
+class FlashcardReviewSerializer(serializers.Serializer):
+    # Plain ids: ownership of the whole session is checked in one query by the view.
+    flashcard = serializers.IntegerField()
+    correct = serializers.BooleanField(required=False, allow_null=True, default=None)
+    quality = serializers.IntegerField(min_value=0, max_value=5, required=False, allow_null=True, default=None)
+    reviewed_at = serializers.DateTimeField(required=False)
+
+class FlashcardReviewSessionSerializer(serializers.Serializer):
+    MAX_REVIEWS = 500
+
+    reviews = FlashcardReviewSerializer(many=True, allow_empty=False)
+
+    def validate_reviews(self, value):
+        if len(value) > self.MAX_REVIEWS:
+            raise serializers.ValidationError(f"A session can contain at most {self.MAX_REVIEWS} reviews.")
+        return value
@@ -0,0 +1,131 @@
+"""
+Coalesce concurrent identical generation requests.
+
+`do(key, fn)` runs fn once per key at a time. Callers in the same process
+wait on the in-flight call and share its result (or exception). Callers in
+other worker processes see a lock in the shared cache and poll for the
+leader's outcome: its result, or its exception, which they re-raise rather
+than repeat the call. They only run fn themselves if the leader gives up
+without producing either. Only calls still in flight are shared: the
+outcome is stored under the leader's lock token, which just the callers
+that saw that lock know, and a request arriving after the call finished
+runs fn again. RESULT_TTL only needs to cover the waiters' poll interval.
+"""
+import hashlib
+import json
+import pickle
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+
+DEFAULTS = {
+    'CACHE': 'default',
+    'LOCK_TIMEOUT': 120,
+    'RESULT_TTL': 10,
+    'POLL_INTERVAL': 0.2,
+}
+
+
+class SharedCallError(Exception):
+    """A leader's exception that could not be stored in the cache as it was."""
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_calls = {}
+_calls_lock = threading.Lock()
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'GENERATION_SINGLEFLIGHT', {})}
+
+
+def make_key(*parts):
+    digest = hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+    return f'sf:{digest}'
+
+
+def _shareable(error):
+    try:
+        pickle.loads(pickle.dumps(error))
+        return error
+    except Exception:
+        return SharedCallError(f"{type(error).__name__}: {error}")
+
+
+def _outcome(shared):
+    if 'error' in shared:
+        raise shared['error']
+    return shared['value']
+
+
+def _run_across_processes(key, fn):
+    config = get_config()
+    cache = caches[config['CACHE']]
+    lock_key = f'{key}:lock'
+    deadline = time.monotonic() + config['LOCK_TIMEOUT']
+
+    while True:
+        token = uuid.uuid4().hex
+        if cache.add(lock_key, token, config['LOCK_TIMEOUT']):
+            try:
+                try:
+                    value = fn()
+                except Exception as e:
+                    cache.set(f'{key}:result:{token}', {'error': _shareable(e)}, config['RESULT_TTL'])
+                    raise
+                cache.set(f'{key}:result:{token}', {'value': value}, config['RESULT_TTL'])
+                return value
+            finally:
+                if cache.get(lock_key) == token:
+                    cache.delete(lock_key)
+
+        # Another worker is generating; wait for its result or its lock to go away.
+        leader = cache.get(lock_key)
+        if leader is None:
+            continue
+        result_key = f'{key}:result:{leader}'
+        while cache.get(lock_key) == leader and time.monotonic() < deadline:
+            shared = cache.get(result_key)
+            if shared is not None:
+                return _outcome(shared)
+            time.sleep(config['POLL_INTERVAL'])
+        # The leader stores its outcome before releasing the lock.
+        shared = cache.get(result_key)
+        if shared is not None:
+            return _outcome(shared)
+        if time.monotonic() >= deadline:
+            return fn()
+
+
+def do(key, fn):
+    with _calls_lock:
+        call = _calls.get(key)
+        leader = call is None
+        if leader:
+            call = _calls[key] = _Call()
+
+    if not leader:
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    try:
+        call.result = _run_across_processes(key, fn)
+    except Exception as e:
+        call.error = e
+        raise
+    finally:
+        with _calls_lock:
+            del _calls[key]
+        call.done.set()
+    return call.result
@@ -0,0 +1,74 @@
+"""
+Per-user quiz and flashcard attempt stats.
+
+Stats for any number of items come from one grouped query (count,
+average, best and the latest attempt via a correlated subquery) over the
+(user, item, time) attempt indexes. That query is cheap enough to run on
+every request, so nothing is cached and nothing has to be invalidated.
+"""
+from django.db.models import Avg, Count, Max, OuterRef, Q, Subquery
+
+from .models import FlashcardAttempt, QuizAttempt
+
+
+def _empty_quiz_stats(quiz_id):
+    return {
+        "quiz_id": quiz_id,
+        "attempts": 0,
+        "average_score": 0,
+        "best_score": 0,
+        "last_score": None
+    }
+
+
+def _empty_flashcard_stats(flashcard_id):
+    return {
+        "flashcard_id": flashcard_id,
+        "attempts": 0,
+        "set_attempts": 0,
+        "correct": 0,
+        "accuracy": 0,
+        "last_reviewed": None
+    }
+
+
+def _compute_quiz_stats(user_id, quiz_ids):
+    attempts = QuizAttempt.objects.filter(user_id=user_id)
+    latest = attempts.filter(quiz_id=OuterRef('quiz_id')).order_by('-attempted_at', '-id').values('score')[:1]
+    rows = (
+        attempts.filter(quiz_id__in=quiz_ids).values('quiz_id')
+        .annotate(attempts=Count('id'), average_score=Avg('score'), best_score=Max('score'), last_score=Subquery(latest))
+        .order_by()
+    )
+    stats = {quiz_id: _empty_quiz_stats(quiz_id) for quiz_id in quiz_ids}
+    for row in rows:
+        stats[row['quiz_id']].update(row)
+    return stats
+
+
+def _compute_flashcard_stats(user_id, flashcard_ids):
+    rows = (
+        FlashcardAttempt.objects.filter(user_id=user_id, flashcard_id__in=flashcard_ids).values('flashcard_id')
+        .annotate(attempts=Count('id'), correct=Count('id', filter=Q(correct=True)), last_reviewed=Max('reviewed_at'))
+        .order_by()
+    )
+    stats = {flashcard_id: _empty_flashcard_stats(flashcard_id) for flashcard_id in flashcard_ids}
+    for row in rows:
+        row['set_attempts'] = row['attempts'] // 5
+        row['accuracy'] = (row['correct'] / row['attempts']) * 100
+        stats[row['flashcard_id']].update(row)
+    return stats
+
+
+def quiz_stats(user_id, quiz_ids):
+    """Stats for each quiz id, in order (duplicates removed)."""
+    quiz_ids = list(dict.fromkeys(quiz_ids))
+    stats = _compute_quiz_stats(user_id, quiz_ids)
+    return [stats[quiz_id] for quiz_id in quiz_ids]
+
+
+def flashcard_stats(user_id, flashcard_ids):
+    """Stats for each flashcard id, in order (duplicates removed)."""
+    flashcard_ids = list(dict.fromkeys(flashcard_ids))
+    stats = _compute_flashcard_stats(user_id, flashcard_ids)
+    return [stats[flashcard_id] for flashcard_id in flashcard_ids]
@@ -0,0 +1,69 @@
+"""
+Daily activity streaks on UserStats.
+
+Days are counted in the user's own time zone. Recording activity is O(1):
+activity on a day that is already counted only moves last_activity
+forward, and the row is locked only when the local date changes (at most
+once a day per user). Streaks that lapse are reset in bulk by the
+decay_streaks command; reads also treat a lapsed streak as 0 so they are
+correct between decay runs.
+"""
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import UserStats
+
+
+def user_timezone(user):
+    return ZoneInfo(user.timezone or settings.TIME_ZONE)
+
+
+def local_date(value, tz):
+    return timezone.localtime(value, tz).date()
+
+
+def start_of_day(day, tz):
+    return datetime.combine(day, time.min, tzinfo=tz)
+
+
+def record_activity(user, timestamps):
+    """Extend user's streak for activity at the given (aware) timestamps."""
+    if not timestamps:
+        return
+    tz = user_timezone(user)
+    latest = max(timestamps)
+    stats, _ = UserStats.objects.get_or_create(user=user)
+    if stats.last_activity is not None and local_date(stats.last_activity, tz) == local_date(latest, tz):
+        # Same local day as the last counted activity: nothing to extend.
+        UserStats.objects.filter(user=user, last_activity__lt=latest).update(last_activity=latest)
+        return
+
+    with transaction.atomic():
+        stats = UserStats.objects.select_for_update().get(user=user)
+        last_day = local_date(stats.last_activity, tz) if stats.last_activity else None
+        for day in sorted({local_date(timestamp, tz) for timestamp in timestamps}):
+            if last_day is not None and day <= last_day:
+                continue  # already counted, or older offline activity
+            if last_day is not None and day == last_day + timedelta(days=1):
+                stats.current_streak += 1
+            else:
+                stats.current_streak = 1
+            last_day = day
+        stats.longest_streak = max(stats.longest_streak, stats.current_streak)
+        if stats.last_activity is None or latest > stats.last_activity:
+            stats.last_activity = latest
+        stats.save(update_fields=['current_streak', 'longest_streak', 'last_activity'])
+
+
+def current_streak(stats, tz, now=None):
+    """stats.current_streak, or 0 if the user missed a whole day since their last activity."""
+    if not stats or not stats.last_activity:
+        return 0
+    today = local_date(now or timezone.now(), tz)
+    if local_date(stats.last_activity, tz) < today - timedelta(days=1):
+        return 0
+    return stats.current_streak
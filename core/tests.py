@@ -1,3 +1,379 @@
-from django.test import TestCase
+import json
+import threading
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import activity, chunking, dedup, generation, jobs, leaderboard, llm, ratelimit, singleflight
+from .ai_cache import get_generation_cache, make_cache_key
+from .models import ActivityLog, Flashcard, Note, Notebook, Question, Quiz, QuizAttempt, ReviewState, User, UserStats
+from .points import award_points
+
+
+class AwardPointsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='pw')
+
+    def test_creates_stats_row_on_first_award(self):
+        award_points(self.user, 30)
+        self.assertEqual(UserStats.objects.get(user=self.user).total_points, 30)
+
+    def test_adds_to_existing_total(self):
+        UserStats.objects.create(user=self.user, total_points=5)
+        award_points(self.user, 10)
+        award_points(self.user, 0)
+        self.assertEqual(UserStats.objects.get(user=self.user).total_points, 15)
+
+
+class ConcurrentAwardPointsTests(TransactionTestCase):
+    THREADS = 8
+    AWARDS_PER_THREAD = 25
+
+    def setUp(self):
+        # SQLite's default in-memory test database is shared-cache: a busy
+        # table fails at once instead of waiting, whatever award_points does.
+        # A file test database (TEST NAME) or PostgreSQL runs this test.
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest("needs a test database that waits on locks")
+
+    def test_parallel_awards_are_not_lost(self):
+        user = User.objects.create_user('bob', password='pw')
+        start = threading.Barrier(self.THREADS)
+        errors = []
+
+        def submit():
+            try:
+                start.wait()
+                for _ in range(self.AWARDS_PER_THREAD):
+                    award_points(user, 10)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=submit) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(
+            UserStats.objects.get(user=user).total_points,
+            self.THREADS * self.AWARDS_PER_THREAD * 10
+        )
+
+
+@override_settings(LLM_BACKEND={'BACKEND': 'fake'}, GENERATION_CHUNK_TOKENS=6000)
+class ChunkedGenerationTests(TestCase):
+    def setUp(self):
+        llm._backend = None
+        get_generation_cache().clear()
+        self.addCleanup(setattr, llm, '_backend', None)
+
+    def test_content_without_sentence_breaks_is_chunked_once(self):
+        # One paragraph with no sentence punctuation is hard-wrapped at
+        # exactly the chunk budget; each piece must then fit as it is.
+        content = '- bullet point about cell biology and mitochondriaX\n' * 600
+        chunks = chunking.split_into_chunks(content, 6000)
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks:
+            self.assertTrue(chunking.fits(chunk, 6000))
+
+        items = generation.generate_quiz_items(content, count=5)
+        self.assertTrue(0 < len(items) <= 5)
+
+
+class FlashcardSessionSchedulingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('carol', password='pw')
+        note = Note.objects.create(notebook=Notebook.objects.create(user=self.user, title='Bio'), title='Cells', content='...')
+        self.card = Flashcard.objects.create(note=note, question='Q', answer='A')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def sync(self, *reviews):
+        response = self.client.post(reverse('submit_flashcard_session'), {
+            'reviews': [
+                {'flashcard': self.card.id, 'correct': correct, 'reviewed_at': reviewed_at.isoformat()}
+                for correct, reviewed_at in reviews
+            ]
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return ReviewState.objects.get(user=self.user, flashcard=self.card)
+
+    def test_reviews_apply_in_reviewed_at_order(self):
+        now = timezone.now()
+        state = self.sync((True, now - timedelta(hours=1)), (True, now - timedelta(days=2)))
+        self.assertEqual((state.repetitions, state.interval_days), (2, 6))
+        self.assertEqual(state.last_reviewed_at, now - timedelta(hours=1))
+
+    def test_older_offline_session_does_not_rewind_schedule(self):
+        now = timezone.now()
+        latest = now - timedelta(hours=1)
+        self.sync((True, now - timedelta(days=2)), (True, latest))
+        state = self.sync((False, now - timedelta(days=30)))
+        self.assertEqual((state.repetitions, state.interval_days), (2, 6))
+        self.assertEqual(state.last_reviewed_at, latest)
+        self.assertEqual(state.due_at, latest + timedelta(days=6))
+
+
+class QuizItemAnalysisTests(TestCase):
+    def test_report_survives_non_string_answers(self):
+        user = User.objects.create_user('dave', password='pw')
+        note = Note.objects.create(notebook=Notebook.objects.create(user=user, title='Bio'), title='Cells', content='...')
+        quiz = Quiz.objects.create(note=note)
+        for text in ('Q1', 'Q2'):
+            Question.objects.create(quiz=quiz, question=text, options=['a', 'b', 'c', 'd'], correct='B')
+        client = APIClient()
+        client.force_authenticate(user)
+
+        response = client.post(reverse('submit_quiz_attempt'), {'quiz': quiz.id, 'answers': [['A'], 'B']}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+        response = client.get(reverse('get_quiz_item_analysis', args=[quiz.id]))
+        self.assertEqual(response.status_code, 200)
+        first, second = response.data['questions']
+        self.assertEqual(first['blank'], 1)
+        self.assertEqual(second['difficulty'], 1.0)
+
+
+class AttemptExportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('erin', password='pw')
+        note = Note.objects.create(notebook=Notebook.objects.create(user=self.user, title='Bio'), title='Cells', content='...')
+        attempt = QuizAttempt.objects.create(user=self.user, quiz=Quiz.objects.create(note=note), score=1.0, answers=['B'])
+        self.attempted_at = timezone.now().replace(microsecond=123456)
+        QuizAttempt.objects.filter(id=attempt.id).update(attempted_at=self.attempted_at)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def export(self, **params):
+        response = self.client.get(reverse('export_quiz_attempts'), params)
+        return response, b''.join(response.streaming_content).decode() if response.streaming else None
+
+    def test_formats_write_the_same_timestamp(self):
+        _, csv_body = self.export(format='csv')
+        _, jsonl_body = self.export(format='jsonl')
+        self.assertEqual(csv_body.splitlines()[1].split(',')[-1], self.attempted_at.isoformat())
+        self.assertEqual(json.loads(jsonl_body)['attempted_at'], self.attempted_at.isoformat())
+
+    def test_errors_are_json(self):
+        response, _ = self.export(format='csv', since='not a date')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertIn('error', response.json())
+
+        self.client.force_authenticate(None)
+        response, _ = self.export(format='csv')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['Content-Type'], 'application/json')
+
+
+@override_settings(LEADERBOARD={'BUCKET_SIZE': 10, 'BUCKETS': 8})
+class LeaderboardIndexTests(TestCase):
+    def setUp(self):
+        self.users = [User.objects.create_user(f'user{i}', password='pw') for i in range(6)]
+        for user, points in zip(self.users, [0, 10, 20, 20, 55, 500]):
+            UserStats.objects.create(user=user, total_points=points)
+        leaderboard.rebuild()
+
+    def assertRanksMatchCounts(self):
+        for points in range(0, 120, 5):
+            with self.subTest(points=points):
+                self.assertEqual(leaderboard.count_above(points), UserStats.objects.filter(total_points__gt=points).count())
+
+    def test_rebuilt_index_matches_counts(self):
+        self.assertRanksMatchCounts()
+
+    def test_awards_move_users_between_buckets(self):
+        award_points(self.users[0], 30)
+        award_points(self.users[1], 40)
+        award_points(self.users[5], 10)
+        self.assertEqual(leaderboard.count_above(50), 2)
+        award_points(User.objects.create_user('late', password='pw'), 70)
+        self.assertRanksMatchCounts()
+
+    def test_rolled_back_award_leaves_index_unchanged(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                award_points(self.users[0], 100)
+                raise RuntimeError
+        self.assertRanksMatchCounts()
+
+    def test_rank_reads_tree_nodes_not_a_full_count(self):
+        with self.assertNumQueries(2):  # tree nodes, then the users in 20's own bucket
+            self.assertEqual(leaderboard.rank_of(20), 3)
+
+
+class NotebookJobTests(TestCase):
+    @override_settings(LLM_BACKEND={'BACKEND': 'fake'}, AI_RATE_LIMIT={'CACHE': 'default'})
+    def test_note_job_logs_activity_like_the_view(self):
+        llm._backend = None
+        self.addCleanup(setattr, llm, '_backend', None)
+        get_generation_cache().clear()
+        user = User.objects.create_user('frank', password='pw')
+        notebook = Notebook.objects.create(user=user, title='Bio')
+        with self.captureOnCommitCallbacks(execute=True):
+            job = jobs.run_job(jobs.enqueue(user, 'note', {'notebook_id': notebook.id, 'title': 'Osmosis'}))
+        activity.flush()
+
+        self.assertEqual(job.status, 'succeeded')
+        logged = ActivityLog.objects.get(user=user, activity_type='note')
+        self.assertEqual((logged.object_id, logged.details), (job.result['note_id'], {'generated': True}))
+
+    def test_job_fails_when_every_note_failed(self):
+        user = User.objects.create_user('erin', password='pw')
+        notebook = Notebook.objects.create(user=user, title='Bio')
+        job = jobs.enqueue(user, 'notebook', {'notebook_id': notebook.id})
+        reports = [{'note_id': 1, 'errors': {'quiz': {'error': 'Too many AI requests.', 'status': 429}}}]
+        with mock.patch.object(generation, 'generate_for_notebook', return_value=reports):
+            jobs.run_job(job)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual(job.error_status, 429)
+        self.assertEqual(job.error, {'error': 'Too many AI requests.'})
+        self.assertEqual(job.result, {'notes': reports})
+
+
+class GenerationCacheKeyTests(TestCase):
+    def test_key_depends_on_backend_and_model(self):
+        fake = llm.build_llm_backend({'BACKEND': 'fake'})
+        flash = llm.build_llm_backend({'BACKEND': 'gemini', 'MODEL': 'gemini-2.0-flash'})
+        pro = llm.build_llm_backend({'BACKEND': 'gemini', 'MODEL': 'gemini-2.5-pro'})
+        keys = {make_cache_key(1, 'notes', backend=backend.cache_identity()) for backend in (fake, flash, pro)}
+        self.assertEqual(len(keys), 3)
+
+
+@override_settings(AI_RATE_LIMIT={
+    'CACHE': 'default', 'GLOBAL_CAPACITY': 100, 'GLOBAL_REFILL_PER_MINUTE': 0.001,
+    'USER_CAPACITY': 5, 'USER_REFILL_PER_MINUTE': 0.001,
+})
+class RateLimitReservationTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+
+    def user_tokens(self, user_id=1):
+        return int(ratelimit.user_bucket(user_id).snapshot()['tokens'])
+
+    def test_every_call_is_charged_to_the_user(self):
+        with ratelimit.acting_user(1):
+            for _ in range(5):
+                ratelimit.acquire()
+            with self.assertRaises(ratelimit.RateLimitExceeded) as raised:
+                ratelimit.acquire()
+        self.assertEqual(raised.exception.scope, 'user')
+
+    def test_reservation_is_all_or_nothing_and_refunds_unused_tokens(self):
+        with ratelimit.acting_user(1):
+            ratelimit.acquire()
+            ratelimit.acquire()
+            with self.assertRaises(ratelimit.RateLimitExceeded):
+                with ratelimit.reserve(4):
+                    self.fail("reserved more tokens than the user has")
+            self.assertEqual(self.user_tokens(), 3)
+
+            with ratelimit.reserve(3):
+                self.assertEqual(self.user_tokens(), 0)
+                ratelimit.acquire()
+            self.assertEqual(self.user_tokens(), 2)
+
+    def test_nested_reservation_tops_up_and_minimum_takes_what_is_left(self):
+        with ratelimit.acting_user(1):
+            with ratelimit.reserve(2):
+                with ratelimit.reserve(3):
+                    self.assertEqual(self.user_tokens(), 2)
+                    with ratelimit.reserve(10, minimum=1):
+                        self.assertEqual(self.user_tokens(), 0)
+            self.assertEqual(self.user_tokens(), 5)
+
+
+@override_settings(AI_RATE_LIMIT={
+    'CACHE': 'default', 'GLOBAL_CAPACITY': 100, 'GLOBAL_REFILL_PER_MINUTE': 0.001,
+    'USER_CAPACITY': 5, 'USER_REFILL_PER_MINUTE': 0.001,
+})
+class CollectNewItemsTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+
+    def test_rounds_share_one_reservation_and_keep_partial_items(self):
+        rounds = []
+
+        def generate_batch(n, attempt):
+            rounds.append((attempt, int(ratelimit.user_bucket(1).snapshot()['tokens'])))
+            if attempt == 2:
+                raise ratelimit.RateLimitExceeded('global', 30)
+            ratelimit.acquire()
+            return [{'question': f'What does organelle {attempt} do in the cell?'}]
+
+        with ratelimit.acting_user(1):
+            items = generation.collect_new_items(generate_batch, dedup.QuestionIndex(), 5)
+        # All three rounds were reserved before the first call.
+        self.assertEqual(rounds, [(0, 2), (1, 2), (2, 2)])
+        self.assertEqual(len(items), 2)
+        # Two calls made; the third reserved token is refunded.
+        self.assertEqual(int(ratelimit.user_bucket(1).snapshot()['tokens']), 3)
+
+    def test_first_round_limit_error_is_raised(self):
+        def generate_batch(n, attempt):
+            raise ratelimit.CircuitOpenError(30)
+
+        with self.assertRaises(ratelimit.CircuitOpenError):
+            generation.collect_new_items(generate_batch, dedup.QuestionIndex(), 5)
+
+
+@override_settings(LLM_BACKEND={'BACKEND': 'fake'}, AI_RATE_LIMIT={'CACHE': 'default', 'BREAKER_THRESHOLD': 2})
+class NoteStreamBreakerTests(TestCase):
+    def setUp(self):
+        llm._backend = None
+        get_generation_cache().clear()
+        caches['default'].clear()
+        self.addCleanup(setattr, llm, '_backend', None)
+
+    def test_disconnect_during_half_open_trial_releases_the_circuit(self):
+        circuit = ratelimit.breaker()
+        caches['default'].set(circuit.key, {'failures': 2, 'opened_until': 0}, None)
+
+        stream = generation.stream_note_text('Photosynthesis')
+        next(stream)  # takes the half-open trial slot
+        self.assertTrue(caches['default'].get(circuit.trial_key))
+        stream.close()
+
+        self.assertIsNone(caches['default'].get(circuit.trial_key))
+        self.assertEqual(circuit.snapshot()['state'], 'closed')
+
+
+@override_settings(GENERATION_SINGLEFLIGHT={'CACHE': 'default', 'POLL_INTERVAL': 0.01})
+class SingleflightErrorSharingTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.key = singleflight.make_key('test', 1)
+
+    def test_leader_stores_its_error_for_waiters(self):
+        def fail():
+            raise ratelimit.CircuitOpenError(42)
+
+        with mock.patch.object(singleflight.uuid, 'uuid4', return_value=mock.Mock(hex='leader')):
+            with self.assertRaises(ratelimit.CircuitOpenError):
+                singleflight.do(self.key, fail)
+        shared = caches['default'].get(f'{self.key}:result:leader')
+        self.assertEqual(shared['error'].retry_after, 42)
+
+    def test_waiter_in_another_process_raises_the_leaders_error(self):
+        # Another worker holds the lock and has stored its failure.
+        caches['default'].set(f'{self.key}:lock', 'leader', 60)
+        caches['default'].set(f'{self.key}:result:leader', {'error': ratelimit.RateLimitExceeded('global', 30)}, 60)
+
+        def rerun():
+            self.fail("waiter re-ran the failed call")
+
+        with self.assertRaises(ratelimit.RateLimitExceeded) as raised:
+            singleflight.do(self.key, rerun)
+        self.assertEqual((raised.exception.scope, raised.exception.retry_after), ('global', 30))
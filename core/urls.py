@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import NotebookViewSet, NoteViewSet, FlashcardViewSet, QuizViewSet, QuestionViewSet, generate_quiz, get_quiz, register_user, user_profile, generate_flashcards, get_flashcards_for_note, get_quizzes, create_study_group, list_user_groups, join_group, leave_group, invite_to_group, list_group_members, search_groups, get_group_details, list_group_shared_content, share_note_with_group, share_quiz_with_group, share_flashcard_with_group, create_shared_link, list_user_shared_links, delete_shared_link, access_shared_link, get_group_chat, send_group_message, get_group_resources, share_resource_to_group, like_resource, delete_group_resource, delete_shared_note_from_group, delete_shared_quiz_from_group, delete_shared_flashcard_from_group, delete_group, list_pending_invitations, accept_invitation, decline_invitation, list_all_groups, generate_note, submit_quiz_attempt, submit_flashcard_attempt, get_quiz_stats, get_flashcard_stats, get_user_progress, get_leaderboard, get_user_points
+from .views import NotebookViewSet, NoteViewSet, FlashcardViewSet, QuizViewSet, QuestionViewSet, generate_quiz, get_quiz, register_user, user_profile, generate_flashcards, get_flashcards_for_note, get_quizzes, create_study_group, list_user_groups, join_group, leave_group, invite_to_group, list_group_members, search_groups, get_group_details, list_group_shared_content, share_note_with_group, share_quiz_with_group, share_flashcard_with_group, create_shared_link, list_user_shared_links, delete_shared_link, access_shared_link, get_group_chat, send_group_message, get_group_resources, share_resource_to_group, like_resource, delete_group_resource, delete_shared_note_from_group, delete_shared_quiz_from_group, delete_shared_flashcard_from_group, delete_group, list_pending_invitations, accept_invitation, decline_invitation, list_all_groups, generate_note, submit_quiz_attempt, submit_flashcard_attempt, get_quiz_stats, get_flashcard_stats, get_user_progress, get_leaderboard, get_user_points, get_ai_cache_stats, get_generation_job, generate_study_set, generate_notebook, generate_note_stream, get_ai_limiter_state, submit_quiz_attempts_batch, submit_flashcard_session, get_due_flashcards, get_group_leaderboard, get_quiz_item_analysis, get_quiz_stats_batch, get_flashcard_stats_batch, export_quiz_attempts, export_flashcard_attempts
 
 
 router = DefaultRouter()
@@ -12,6 +12,7 @@ router.register(r'questions', QuestionViewSet, basename='question')
 
 urlpatterns = [
     path('notes/generate/', generate_note, name='generate_note'),
+    path('notes/generate/stream/', generate_note_stream, name='generate_note_stream'),
     path('', include(router.urls)),
 ]
 
@@ -21,6 +22,8 @@ urlpatterns += [
     path('register/', register_user, name='register_user'),
     path('profile/', user_profile, name='user_profile'),
     path('generate_flashcards/<int:note_id>/', generate_flashcards, name='generate_flashcards'),
+    path('generate_study_set/<int:note_id>/', generate_study_set, name='generate_study_set'),
+    path('generate_notebook/<int:notebook_id>/', generate_notebook, name='generate_notebook'),
     path('get_flashcards/<int:note_id>/', get_flashcards_for_note, name='get_flashcards_for_note'),
     path('get_quizzes/<int:note_id>/', get_quizzes, name='get_quizzes'),
     path('groups/create/', create_study_group, name='create_study_group'),
@@ -29,6 +32,7 @@ urlpatterns += [
     path('groups/<int:group_id>/leave/', leave_group, name='leave_group'),
     path('groups/<int:group_id>/invite/', invite_to_group, name='invite_to_group'),
     path('groups/<int:group_id>/members/', list_group_members, name='list_group_members'),
+    path('groups/<int:group_id>/leaderboard/', get_group_leaderboard, name='get_group_leaderboard'),
     path('groups/<int:group_id>/', get_group_details, name='get_group_details'),
     path('groups/<int:group_id>/delete/', delete_group, name='delete_group'),
     path('groups/<int:group_id>/shared-content/', list_group_shared_content, name='list_group_shared_content'),
@@ -54,10 +58,21 @@ urlpatterns += [
     path('invitations/<int:invitation_id>/decline/', decline_invitation, name='decline_invitation'),
     path('groups/all/', list_all_groups, name='list_all_groups'),
     path('quiz_attempts/', submit_quiz_attempt, name='submit_quiz_attempt'),
+    path('quiz_attempts/batch/', submit_quiz_attempts_batch, name='submit_quiz_attempts_batch'),
     path('flashcard_attempts/', submit_flashcard_attempt, name='submit_flashcard_attempt'),
+    path('flashcard_attempts/session/', submit_flashcard_session, name='submit_flashcard_session'),
+    path('review/due/', get_due_flashcards, name='get_due_flashcards'),
+    path('quiz_stats/', get_quiz_stats_batch, name='get_quiz_stats_batch'),
     path('quiz_stats/<int:quiz_id>/', get_quiz_stats, name='get_quiz_stats'),
+    path('quiz_analysis/<int:quiz_id>/', get_quiz_item_analysis, name='get_quiz_item_analysis'),
+    path('flashcard_stats/', get_flashcard_stats_batch, name='get_flashcard_stats_batch'),
     path('flashcard_stats/<int:flashcard_id>/', get_flashcard_stats, name='get_flashcard_stats'),
+    path('export/quiz_attempts/', export_quiz_attempts, name='export_quiz_attempts'),
+    path('export/flashcard_attempts/', export_flashcard_attempts, name='export_flashcard_attempts'),
     path('user/progress/', get_user_progress, name='get_user_progress'),
     path('leaderboard/', get_leaderboard, name='get_leaderboard'),
     path('user/points/', get_user_points, name='get_user_points'),
+    path('ai/cache/stats/', get_ai_cache_stats, name='get_ai_cache_stats'),
+    path('ai/limiter/', get_ai_limiter_state, name='get_ai_limiter_state'),
+    path('generation_jobs/<uuid:job_id>/', get_generation_job, name='get_generation_job'),
 ]
\ No newline at end of file
@@ -1,21 +1,24 @@
-from django.conf import settings
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
+from rest_framework.renderers import BaseRenderer, JSONRenderer
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework import viewsets
 from rest_framework.permissions import IsAuthenticated, AllowAny
-from .models import Notebook, Note, Flashcard, Quiz, Question, StudyGroup, GroupMembership, SharedNote, SharedQuiz, SharedFlashcard, SharedLink, ChatMessage, GroupResource, ResourceLike, GroupInvitation, QuizAttempt, FlashcardAttempt, UserStats
-from .serializers import NotebookSerializer, NoteSerializer, FlashcardSerializer, QuizSerializer, QuestionSerializer, UserRegistrationSerializer, UserProfileSerializer, StudyGroupSerializer, GroupMembershipSerializer, SharedNoteSerializer, SharedQuizSerializer, SharedFlashcardSerializer, SharedLinkSerializer, ChatMessageSerializer, GroupResourceSerializer, GroupInvitationSerializer, QuizAttemptSerializer, FlashcardAttemptSerializer
+from .models import Notebook, Note, Flashcard, Quiz, Question, StudyGroup, GroupMembership, SharedNote, SharedQuiz, SharedFlashcard, SharedLink, ChatMessage, GroupResource, ResourceLike, GroupInvitation, QuizAttempt, FlashcardAttempt, UserStats, GenerationJob, UserProgress
+from .serializers import NotebookSerializer, NoteSerializer, FlashcardSerializer, QuizSerializer, QuestionSerializer, UserRegistrationSerializer, UserProfileSerializer, StudyGroupSerializer, GroupMembershipSerializer, SharedNoteSerializer, SharedQuizSerializer, SharedFlashcardSerializer, SharedLinkSerializer, ChatMessageSerializer, GroupResourceSerializer, GroupInvitationSerializer, QuizAttemptSerializer, FlashcardAttemptSerializer, FlashcardReviewSessionSerializer
 
-import google.generativeai as genai
 import json
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
 from django.contrib.auth import get_user_model
 User = get_user_model()
-from django.db.models import Max, Avg, Count
+from django.db.models import Count, Q
+from django.utils import timezone
 from django.core.management import call_command
 from rest_framework.permissions import IsAdminUser
-
-genai.configure(api_key=settings.GEMINI_API_KEY)
+from django.db import transaction
+from . import activity, export, generation, grading, jobs, leaderboard, pagination, points, progress, ratelimit, rollups, scheduler, singleflight, stats, streaks
+from .ai_cache import get_generation_cache
 
 class NotebookViewSet(viewsets.ModelViewSet):
     serializer_class = NotebookSerializer
@@ -34,6 +37,10 @@ class NoteViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         return Note.objects.filter(notebook__user=self.request.user)
 
+    def perform_create(self, serializer):
+        note = serializer.save()
+        activity.log(self.request.user, 'note', note.id)
+
 
 class FlashcardViewSet(viewsets.ModelViewSet):
     serializer_class = FlashcardSerializer
@@ -56,6 +63,27 @@ class QuestionViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         return Question.objects.filter(quiz__note__notebook__user=self.request.user)
 
+def _wants_async(request):
+    """Generation endpoints queue a background job when called with async=true."""
+    value = request.data.get('async', request.query_params.get('async', False))
+    return str(value).lower() in ('1', 'true', 'yes')
+
+def _should_queue(request, calls):
+    """
+    Queue generation as a background job when asked to (async=true) or when
+    it needs more LLM calls than one request may reserve; requests never
+    sleep waiting for rate-limit capacity.
+    """
+    return _wants_async(request) or calls > ratelimit.user_capacity()
+
+def _job_accepted(request, job):
+    return Response({
+        "message": "Generation job queued.",
+        "job_id": str(job.id),
+        "status": job.status,
+        "status_url": request.build_absolute_uri(f"/api/generation_jobs/{job.id}/")
+    }, status=202)
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def generate_quiz(request, note_id):
@@ -71,100 +99,27 @@ def generate_quiz(request, note_id):
     temperature = float(request.data.get('temperature', 1.0))
     variation = request.data.get('variation', None)
 
-    prompt = f"""
-    Generate 5 unique multiple choice questions based on the following note:
-    \"\"\"{note.content}\"\"\"
-    {f'Variation: {variation}' if variation else ''}
-
-    Respond ONLY with a valid JSON list of dictionaries formatted like this:
-    [
-      {{
-        "question": "...",
-        "options": ["A", "B", "C", "D"],
-        "correct": "B"
-      }},
-      ...
-    ]
+    # Check if API key is configured
+    if not generation.is_configured():
+        return Response({"error": "AI service not configured"}, status=500)
 
-    But don't let the questions have their choices infront, like A) or B) or C) or D) just only the options.
-    
-    If you have generated questions for this note before, do NOT repeat them. Make these questions as different as possible from previous ones.
-    """
+    if _should_queue(request, generation.estimated_calls([note.content])):
+        job = jobs.enqueue(request.user, 'quiz', {"note_id": note.id, "temperature": temperature, "variation": variation})
+        return _job_accepted(request, job)
 
-    try:
-        # Check if API key is configured
-        if not hasattr(settings, 'GEMINI_API_KEY') or not settings.GEMINI_API_KEY:
-            return Response({"error": "AI service not configured"}, status=500)
-
-        model = genai.GenerativeModel(
-            'gemini-2.0-flash',
-            generation_config={
-                "response_mime_type": "application/json",
-                "temperature": temperature
-            }
-        )
-        
-        print(f"Calling Gemini API with prompt length: {len(prompt)}")
-        response = model.generate_content(prompt)
-        content = response.text
-        print(f"Received response from Gemini: {content[:200]}...")
-
-        try:
-            quiz_data = json.loads(content)
-        except json.JSONDecodeError as e:
-            print(f"JSON decode error: {e}")
-            print(f"Raw content: {content}")
-            return Response({
-                "error": "Could not parse Gemini output",
-                "raw": content
-            }, status=500)
-
-        # Validate structure before saving to DB
-        if not isinstance(quiz_data, list) or not all(
-            isinstance(q, dict) and
-            'question' in q and
-            'options' in q and
-            'correct' in q and
-            isinstance(q['options'], list)
-            for q in quiz_data
-        ):
-            return Response({"error": "Invalid quiz format"}, status=400)
-
-        quiz = Quiz.objects.create(note=note)
-        for q in quiz_data:
-            Question.objects.create(
-                quiz=quiz,
-                question=q['question'],
-                options=q['options'],
-                correct=q['correct']
-            )
-
-        return Response({"message": "Quiz generated successfully", "quiz_id": quiz.id}, status=201)
+    def run():
+        with ratelimit.acting_user(request.user.id):
+            quiz = generation.create_quiz(note, temperature=temperature, variation=variation)
+        return {"message": "Quiz generated successfully", "quiz_id": quiz.id}
 
+    try:
+        # Double-clicks and retries that overlap an in-flight request share its generation instead of creating duplicate quizzes.
+        key = singleflight.make_key('generate_quiz', request.user.id, note.id, temperature, variation)
+        return Response(singleflight.do(key, run), status=201)
     except Exception as e:
-        error_message = str(e)
-        print(f"Error in generate_quiz: {error_message}")
-        
-        # Handle quota exceeded error
-        if "429" in error_message or "quota" in error_message.lower() or "exceeded" in error_message.lower():
-            return Response({
-                "error": "AI service quota exceeded. Please try again tomorrow or upgrade your plan.",
-                "details": "You've reached the daily limit for AI requests."
-            }, status=429)
-        
-        # Handle other AI errors
-        elif "google.api_core.exceptions" in str(type(e)):
-            return Response({
-                "error": "AI service temporarily unavailable. Please try again later.",
-                "details": error_message
-            }, status=503)
-        
-        # Handle other errors
-        else:
-            return Response({
-                "error": "Failed to generate quiz. Please try again.",
-                "details": error_message
-            }, status=500)
+        print(f"Error in generate_quiz: {e}")
+        status_code, body = generation.describe_error(e, "Failed to generate quiz. Please try again.")
+        return Response(body, status=status_code)
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
@@ -228,89 +183,124 @@ def generate_flashcards(request, note_id):
     except Note.DoesNotExist:
         return Response({"error": "Note not found"}, status=404)
 
-    prompt = f"""
-    Generate 5 flashcards based on the following note content:
-    \"\"\"{note.content}\"\"\"
-
-    Respond ONLY with a valid JSON list of dictionaries formatted like this:
-    [
-      {{
-        "question": "What is...?",
-        "answer": "The answer is..."
-      }},
-      ...
-    ]
-
-    If you have generated questions for this note before, do NOT repeat them. Make these questions as different as possible from previous ones.
-    """
-
-    try:
-        if not hasattr(settings, 'GEMINI_API_KEY') or not settings.GEMINI_API_KEY:
-            return Response({"error": "AI service not configured"}, status=500)
+    if not generation.is_configured():
+        return Response({"error": "AI service not configured"}, status=500)
 
-        model = genai.GenerativeModel(
-            'gemini-2.0-flash',
-            generation_config={"response_mime_type": "application/json"}
-        )
-        response = model.generate_content(prompt)
-        content = response.text
-        print(f"Received response from Gemini: {content[:200]}...")
+    if _should_queue(request, generation.estimated_calls([note.content])):
+        job = jobs.enqueue(request.user, 'flashcards', {"note_id": note.id})
+        return _job_accepted(request, job)
 
-        try:
-            flashcard_data = json.loads(content)
-        except json.JSONDecodeError as e:
-            return Response({
-                "error": "Could not parse Gemini output",
-                "raw": content
-            }, status=500)
-
-        # Validate structure before saving to DB
-        if not isinstance(flashcard_data, list) or not all(
-            isinstance(fc, dict) and
-            'question' in fc and
-            'answer' in fc
-            for fc in flashcard_data
-        ):
-            return Response({"error": "Invalid flashcard format"}, status=400)
-
-        # Create flashcards
-        created_flashcards = []
-        for fc in flashcard_data:
-            flashcard = Flashcard.objects.create(
-                note=note,
-                question=fc['question'],
-                answer=fc['answer']
-            )
-            created_flashcards.append({
+    def run():
+        with ratelimit.acting_user(request.user.id):
+            flashcards = generation.create_flashcards(note)
+        created_flashcards = [
+            {
                 "id": flashcard.id,
                 "question": flashcard.question,
                 "answer": flashcard.answer
-            })
-
-        return Response({
+            } for flashcard in flashcards
+        ]
+        return {
             "message": f"Generated {len(created_flashcards)} flashcards successfully",
             "flashcards": created_flashcards
-        }, status=201)
+        }
 
+    try:
+        key = singleflight.make_key('generate_flashcards', request.user.id, note.id)
+        return Response(singleflight.do(key, run), status=201)
     except Exception as e:
-        error_message = str(e)
-        print(f"Error in generate_flashcards: {error_message}")
+        print(f"Error in generate_flashcards: {e}")
+        status_code, body = generation.describe_error(e, "Failed to generate flashcards. Please try again.")
+        return Response(body, status=status_code)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def generate_study_set(request, note_id):
+    """
+    Generates a quiz and a set of flashcards for a note from one Gemini call,
+    saving both together.
+    """
+    try:
+        note = Note.objects.get(id=note_id, notebook__user=request.user)
+    except Note.DoesNotExist:
+        return Response({"error": "Note not found"}, status=404)
+
+    temperature = float(request.data.get('temperature', 1.0))
+    variation = request.data.get('variation', None)
+
+    if not generation.is_configured():
+        return Response({"error": "AI service not configured"}, status=500)
+
+    if _should_queue(request, generation.estimated_calls([note.content])):
+        job = jobs.enqueue(request.user, 'study_set', {"note_id": note.id, "temperature": temperature, "variation": variation})
+        return _job_accepted(request, job)
+
+    def run():
+        with ratelimit.acting_user(request.user.id):
+            quiz, flashcards = generation.create_study_set(note, temperature=temperature, variation=variation)
+        return {
+            "message": "Study set generated successfully",
+            "quiz_id": quiz.id,
+            "flashcards": [
+                {
+                    "id": flashcard.id,
+                    "question": flashcard.question,
+                    "answer": flashcard.answer
+                } for flashcard in flashcards
+            ]
+        }
+
+    try:
+        key = singleflight.make_key('generate_study_set', request.user.id, note.id, temperature, variation)
+        return Response(singleflight.do(key, run), status=201)
+    except Exception as e:
+        print(f"Error in generate_study_set: {e}")
+        status_code, body = generation.describe_error(e, "Failed to generate study set. Please try again.")
+        return Response(body, status=status_code)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def generate_notebook(request, notebook_id):
+    """
+    Expects: {"kinds": ["flashcards", "quiz"]} (optional, defaults to both)
+    Generates content for every note in the notebook and reports per note.
+    Notebooks needing more LLM calls than the user's rate limit allows at
+    once are queued as a background job (202) instead.
+    """
+    try:
+        notebook = Notebook.objects.get(id=notebook_id, user=request.user)
+    except Notebook.DoesNotExist:
+        return Response({"error": "Notebook not found or access denied."}, status=404)
+
+    kinds = request.data.get('kinds') or list(generation.NOTEBOOK_KINDS)
+    if not isinstance(kinds, list) or not set(kinds) <= set(generation.NOTEBOOK_KINDS):
+        return Response({"error": f"kinds must be a list drawn from {list(generation.NOTEBOOK_KINDS)}"}, status=400)
+
+    if not generation.is_configured():
+        return Response({"error": "AI service not configured"}, status=500)
+
+    contents = Note.objects.filter(notebook=notebook).values_list('content', flat=True)
+    if _should_queue(request, generation.estimated_calls(contents, len(kinds))):
+        job = jobs.enqueue(request.user, 'notebook', {"notebook_id": notebook.id, "kinds": kinds})
+        return _job_accepted(request, job)
+
+    try:
+        with ratelimit.acting_user(request.user.id):
+            reports = generation.generate_for_notebook(notebook, kinds)
+    except (ratelimit.RateLimitExceeded, ratelimit.CircuitOpenError) as e:
+        status_code, body = generation.describe_error(e, "Failed to generate notebook content.")
+        return Response(body, status=status_code)
+    failed = [report for report in reports if report.get("errors")]
+    response_status = 201
+    if reports and len(failed) == len(reports):
+        # Nothing succeeded; surface the upstream error (e.g. 429) to the client.
+        response_status = next(iter(failed[0]["errors"].values()))["status"]
+    return Response({
+        "message": f"Generated content for {len(reports) - len(failed)} of {len(reports)} notes",
+        "notebook_id": notebook.id,
+        "notes": reports
+    }, status=response_status)
 
-        if "429" in error_message or "quota" in error_message.lower() or "exceeded" in error_message.lower():
-            return Response({
-                "error": "AI service quota exceeded. Please try again tomorrow or upgrade your plan.",
-                "details": "You've reached the daily limit for AI requests."
-            }, status=429)
-        elif "google.api_core.exceptions" in str(type(e)):
-            return Response({
-                "error": "AI service temporarily unavailable. Please try again later.",
-                "details": error_message
-            }, status=503)
-        else:
-            return Response({
-                "error": "Failed to generate flashcards. Please try again.",
-                "details": error_message
-            }, status=500)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_flashcards_for_note(request, note_id):
@@ -732,6 +722,11 @@ def delete_shared_flashcard_from_group(request, flashcard_id, group_id):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_group_chat(request, group_id):
+    """
+    Chat history, oldest first, a page at a time: the latest ?limit=N
+    messages (default 50, max 200), older ones with ?before=<cursor>, or
+    newer ones with ?after=<cursor>.
+    """
     try:
         group = StudyGroup.objects.get(id=group_id)
     except StudyGroup.DoesNotExist:
@@ -741,9 +736,29 @@ def get_group_chat(request, group_id):
     if not GroupMembership.objects.filter(user=request.user, group=group).exists():
         return Response({"error": "You are not a member of this group"}, status=403)
     
-    messages = ChatMessage.objects.filter(group=group)
-    serializer = ChatMessageSerializer(messages, many=True)
-    return Response(serializer.data)
+    before = request.query_params.get('before') or None
+    after = request.query_params.get('after') or None
+    if before and after:
+        return Response({"error": "Use either before or after, not both"}, status=400)
+    try:
+        limit = min(max(int(request.query_params.get('limit', 50)), 1), 200)
+    except ValueError:
+        return Response({"error": "limit must be an integer"}, status=400)
+    try:
+        messages, has_more = pagination.keyset_page(
+            ChatMessage.objects.filter(group=group).select_related('user'), limit, before=before, after=after
+        )
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+
+    # "before" pages back through history, "after" polls for new messages;
+    # an empty poll hands back the same cursor to poll with again.
+    return Response({
+        "results": ChatMessageSerializer(messages, many=True).data,
+        "before": pagination.encode_cursor(messages[0]) if messages else before,
+        "after": pagination.encode_cursor(messages[-1]) if messages else after,
+        "has_more": has_more
+    })
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -1054,52 +1069,95 @@ def generate_note(request):
     except Notebook.DoesNotExist:
         return Response({"error": "Notebook not found or access denied."}, status=404)
 
-    ai_prompt = f"""
-Write a single, clear, and concise paragraph about the following topic for a student audience: '{title}'.
-{prompt}
+    if not generation.is_configured():
+        return Response({"error": "AI service not configured"}, status=500)
+
+    if _wants_async(request):
+        job = jobs.enqueue(request.user, 'note', {"notebook_id": notebook.id, "title": title, "prompt": prompt})
+        return _job_accepted(request, job)
+
+    def run():
+        with ratelimit.acting_user(request.user.id):
+            note = generation.create_note(notebook, title, prompt)
+        activity.log(request.user, 'note', note.id, {"generated": True})
+        return {
+            "message": "Note generated and saved successfully.",
+            "note": NoteSerializer(note).data
+        }
+
+    try:
+        key = singleflight.make_key('generate_note', request.user.id, notebook.id, title, prompt)
+        return Response(singleflight.do(key, run), status=201)
+    except (ratelimit.RateLimitExceeded, ratelimit.CircuitOpenError) as e:
+        status_code, body = generation.describe_error(e, "Failed to generate note.")
+        return Response(body, status=status_code)
+    except Exception as e:
+        return Response({"error": f"Failed to generate note: {str(e)}"}, status=500)
 
-- Do not use headings, bullet points, or lists.
-- Respond ONLY with one well-written paragraph of plain text.
-- If you have generated notes for this notebook before, do NOT repeat them. Make these notes as different as possible from previous ones.
+def _sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
 
-Respond ONLY with a valid JSON object formatted like this:
-{{
-  "content": "generated content here"
-}}
+class EventStreamRenderer(BaseRenderer):
+    """Lets clients send Accept: text/event-stream; plain Responses become a single "error" event."""
+    media_type = 'text/event-stream'
+    format = 'sse'
 
-Do not include any other text, markdown, or explanation.
-"""
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return _sse_event("error", data).encode()
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([JSONRenderer, EventStreamRenderer])
+def generate_note_stream(request):
+    """
+    Same input as generate_note, but streams the note back as server-sent
+    events: "chunk" events carry text as it is generated, then a "done"
+    event carries the saved note (or an "error" event if generation fails).
+    """
+    title = request.data.get('title')
+    notebook_id = request.data.get('notebook_id')
+    prompt = request.data.get('prompt', '')
+
+    if not title or not notebook_id:
+        return Response({"error": "Title and notebook_id are required."}, status=400)
 
     try:
-        if not hasattr(settings, 'GEMINI_API_KEY') or not settings.GEMINI_API_KEY:
-            return Response({"error": "AI service not configured"}, status=500)
+        notebook = Notebook.objects.get(id=notebook_id, user=request.user)
+    except Notebook.DoesNotExist:
+        return Response({"error": "Notebook not found or access denied."}, status=404)
 
-        model = genai.GenerativeModel(
-            'gemini-2.0-flash',
-            generation_config={"response_mime_type": "application/json"}
-        )
-        response = model.generate_content(ai_prompt)
-        content = response.text.strip()
+    if not generation.is_configured():
+        return Response({"error": "AI service not configured"}, status=500)
 
-        # Parse the JSON and extract only the plain text
+    user_id = request.user.id
+
+    def events():
+        parts = []
         try:
-            parsed = json.loads(content)
-            plain_text = parsed["content"]
-        except Exception:
-            plain_text = content  # fallback if not JSON
-
-        note = Note.objects.create(
-            notebook=notebook,
-            title=title,
-            content=plain_text
-        )
-        serializer = NoteSerializer(note)
-        return Response({
+            with ratelimit.acting_user(user_id):
+                for text in generation.stream_note_text(title, prompt):
+                    parts.append(text)
+                    yield _sse_event("chunk", {"text": text})
+            note = Note.objects.create(
+                notebook=notebook,
+                title=title,
+                content=''.join(parts).strip()
+            )
+            activity.log(user_id, 'note', note.id, {"generated": True})
+        except Exception as e:
+            print(f"Error in generate_note_stream: {e}")
+            status_code, body = generation.describe_error(e, "Failed to generate note. Please try again.")
+            yield _sse_event("error", dict(body, status=status_code))
+            return
+        yield _sse_event("done", {
             "message": "Note generated and saved successfully.",
-            "note": serializer.data
-        }, status=201)
-    except Exception as e:
-        return Response({"error": f"Failed to generate note: {str(e)}"}, status=500)
+            "note": NoteSerializer(note).data
+        })
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # keep proxies from buffering the stream
+    return response
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -1121,66 +1179,100 @@ def submit_quiz_attempt(request):
     except Quiz.DoesNotExist:
         return Response({"error": "Quiz not found"}, status=404)
 
-    questions = list(Question.objects.filter(quiz=quiz))
+    key = grading.answer_keys([quiz.id])[quiz.id]
 
-    if len(answers) != len(questions):
+    if len(answers) != len(key):
         return Response({"error": "Number of answers does not match number of questions"}, status=400)
 
-    correct_count = 0
-
-    for user_ans, q in zip(answers, questions):
-        # Clean function to remove letter prefixes
-        def clean_text(text):
-            import re
-            # Remove patterns like "A. ", "B. ", etc. from the beginning
-            return re.sub(r'^[A-D]\.\s*', '', text.strip())
-        
-        # Check if q.correct is already a letter (A, B, C, D)
-        if len(q.correct.strip()) == 1 and q.correct.strip().upper() in 'ABCD':
-            # q.correct is already a letter
-            correct_letter = q.correct.strip().upper()
-        else:
-            # q.correct is text, need to find matching option
-            correct_letter = ''
-            correct_text_clean = clean_text(q.correct).lower()
-            
-            for idx, opt in enumerate(q.options):
-                option_text_clean = clean_text(opt).lower()
-                if option_text_clean == correct_text_clean:
-                    correct_letter = chr(65 + idx)  # e.g., 0 -> 'A', 1 -> 'B'
-                    break
-
-        if user_ans.upper() == correct_letter:
-            correct_count += 1
-        else:
-            print(f"[DEBUG] User answered: {user_ans}, correct was: {correct_letter} ({q.correct})")
-            print(f"[DEBUG] Question: {q.question}")
-            print(f"[DEBUG] Options: {q.options}")
-
-    score = (correct_count / len(questions)) * 100 if questions else 0
-
-    attempt = QuizAttempt.objects.create(
-        user=user,
-        quiz=quiz,
-        score=score,
-        answers=answers
-    )
+    correct_count, _ = grading.grade(answers, key)
+    score = (correct_count / len(key)) * 100 if key else 0
 
-    # Award points: 10 per correct answer
-    user_stats, _ = UserStats.objects.get_or_create(user=user)
-    user_stats.total_points += correct_count * 10
-    user_stats.save()
+    with transaction.atomic():
+        attempt = QuizAttempt.objects.create(
+            user=user,
+            quiz=quiz,
+            score=score,
+            answers=answers
+        )
+        progress.record_quiz_attempts(user, [attempt])
+        activity.log(user, 'quiz', quiz.id, {"attempt_id": attempt.id, "score": score})
+        # Award points: 10 per correct answer
+        points.award_points(user, correct_count * 10)
 
     out_serializer = QuizAttemptSerializer(attempt)
 
     return Response({
         "message": "Quiz attempt recorded.",
         "score": score,
-        "total_questions": len(questions),
+        "total_questions": len(key),
         "correct": correct_count,
         "attempt": out_serializer.data,
         "points_awarded": correct_count * 10
     }, status=201)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def submit_quiz_attempts_batch(request):
+    """
+    Expects: {"attempts": [{"quiz": <quiz_id>, "answers": ["A", "B", ...]}, ...]}
+    Grades every attempt against answer keys loaded in one query, saves them
+    together and awards points once. Nothing is saved if any attempt is invalid.
+    """
+    user = request.user
+    entries = request.data.get('attempts')
+    if not isinstance(entries, list) or not entries:
+        return Response({"error": "attempts must be a non-empty list"}, status=400)
+
+    serializer = QuizAttemptSerializer(data=entries, many=True)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=400)
+
+    submissions = [(item['quiz'].id, item['answers']) for item in serializer.validated_data]
+    keys = grading.answer_keys({quiz_id for quiz_id, _ in submissions})
+
+    errors = {}
+    for position, (quiz_id, answers) in enumerate(submissions):
+        if not keys[quiz_id]:
+            errors[position] = f"Quiz {quiz_id} has no questions"
+        elif len(answers) != len(keys[quiz_id]):
+            errors[position] = "Number of answers does not match number of questions"
+    if errors:
+        return Response({"error": "Some attempts could not be graded", "details": errors}, status=400)
+
+    attempts = []
+    results = []
+    total_correct = 0
+    for quiz_id, answers in submissions:
+        key = keys[quiz_id]
+        correct_count, _ = grading.grade(answers, key)
+        score = (correct_count / len(key)) * 100
+        total_correct += correct_count
+        attempts.append(QuizAttempt(user=user, quiz_id=quiz_id, score=score, answers=answers))
+        results.append({
+            "quiz": quiz_id,
+            "score": score,
+            "total_questions": len(key),
+            "correct": correct_count,
+            "points_awarded": correct_count * 10
+        })
+
+    with transaction.atomic():
+        attempts = QuizAttempt.objects.bulk_create(attempts)
+        progress.record_quiz_attempts(user, attempts)
+        activity.log_many(user, 'quiz', [
+            (attempt.quiz_id, {"attempt_id": attempt.id, "score": attempt.score}) for attempt in attempts
+        ])
+        points.award_points(user, total_correct * 10)
+
+    for result, attempt in zip(results, attempts):
+        result["attempt_id"] = attempt.id
+
+    return Response({
+        "message": f"{len(attempts)} quiz attempts recorded.",
+        "results": results,
+        "points_awarded": total_correct * 10
+    }, status=201)
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def submit_flashcard_attempt(request):
@@ -1194,22 +1286,24 @@ def submit_flashcard_attempt(request):
         return Response(serializer.errors, status=400)
     flashcard_id = serializer.validated_data['flashcard'].id if hasattr(serializer.validated_data['flashcard'], 'id') else serializer.validated_data['flashcard']
     correct = serializer.validated_data.get('correct', None)
+    quality = serializer.validated_data.get('quality', None)
     try:
         flashcard = Flashcard.objects.get(id=flashcard_id)
     except Flashcard.DoesNotExist:
         return Response({"error": "Flashcard not found"}, status=404)
-    attempt = FlashcardAttempt.objects.create(
-        user=user,
-        flashcard=flashcard,
-        correct=correct
-    )
-    # Award points: 10 per correct flashcard
-    points_awarded = 0
-    if correct is True:
-        user_stats, _ = UserStats.objects.get_or_create(user=user)
-        user_stats.total_points += 10
-        user_stats.save()
-        points_awarded = 10
+    with transaction.atomic():
+        attempt = FlashcardAttempt.objects.create(
+            user=user,
+            flashcard=flashcard,
+            correct=correct
+        )
+        scheduler.record_reviews(user, [(flashcard.id, scheduler.quality_for(correct, quality), attempt.reviewed_at)])
+        progress.record_flashcard_attempts(user, [attempt])
+        activity.log(user, 'flashcard', flashcard.id, {"correct": correct})
+        # Award points: 10 per correct flashcard
+        points_awarded = 0
+        if correct is True:
+            points_awarded = points.award_points(user, 10)
     out_serializer = FlashcardAttemptSerializer(attempt)
     return Response({
         "message": "Flashcard attempt recorded.",
@@ -1217,99 +1311,331 @@ def submit_flashcard_attempt(request):
         "points_awarded": points_awarded
     }, status=201)
 
-@api_view(['GET'])
+@api_view(['POST'])
 @permission_classes([IsAuthenticated])
-def get_quiz_stats(request, quiz_id):
+def submit_flashcard_session(request):
+    """
+    Expects: {"reviews": [{"flashcard": <flashcard_id>, "correct": true/false/null,
+                           "quality": 0-5 (optional), "reviewed_at": <ISO timestamp, optional>}, ...]}
+    Records a whole (possibly offline) review session in one request: checks
+    the user can access every card in one query, bulk-inserts the attempts in
+    order, updates each card's review schedule and awards 10 points per
+    correct card in a single update.
+    """
     user = request.user
-    attempts = QuizAttempt.objects.filter(user=user, quiz_id=quiz_id)
-    total_attempts = attempts.count()
-    if total_attempts == 0:
-        return Response({
-            "quiz_id": quiz_id,
-            "attempts": 0,
-            "average_score": 0,
-            "best_score": 0,
-            "last_score": None
-        })
-    average_score = attempts.aggregate(avg=Avg('score'))['avg']
-    best_score = attempts.aggregate(max=Max('score'))['max']
-    last_score = attempts.order_by('-attempted_at').first().score
+    serializer = FlashcardReviewSessionSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=400)
+    reviews = serializer.validated_data['reviews']
+
+    card_ids = {review['flashcard'] for review in reviews}
+    accessible = set(
+        Flashcard.objects.filter(id__in=card_ids).filter(
+            Q(note__notebook__user=user)
+            | Q(sharedflashcard__group__memberships__user=user)
+            | Q(note__sharednote__group__memberships__user=user)
+        ).values_list('id', flat=True).distinct()
+    )
+    missing = sorted(card_ids - accessible)
+    if missing:
+        return Response({"error": "Flashcards not found", "flashcards": missing}, status=404)
+
+    # Client clocks can run ahead; never record a review in the future.
+    now = timezone.now()
+    attempts = [
+        FlashcardAttempt(
+            user=user,
+            flashcard_id=review['flashcard'],
+            correct=review['correct'],
+            reviewed_at=min(review.get('reviewed_at') or now, now)
+        )
+        for review in reviews
+    ]
+    correct_count = sum(1 for review in reviews if review['correct'] is True)
+    points_awarded = correct_count * 10
+
+    with transaction.atomic():
+        FlashcardAttempt.objects.bulk_create(attempts)
+        scheduler.record_reviews(user, [
+            (attempt.flashcard_id, scheduler.quality_for(review['correct'], review['quality']), attempt.reviewed_at)
+            for review, attempt in zip(reviews, attempts)
+        ])
+        progress.record_flashcard_attempts(user, attempts)
+        activity.log_many(user, 'flashcard', [(attempt.flashcard_id, {"correct": attempt.correct}) for attempt in attempts])
+        points.award_points(user, points_awarded)
+
     return Response({
-        "quiz_id": quiz_id,
-        "attempts": total_attempts,
-        "average_score": average_score,
-        "best_score": best_score,
-        "last_score": last_score
-    })
+        "message": "Review session recorded.",
+        "reviewed": len(attempts),
+        "correct": correct_count,
+        "points_awarded": points_awarded
+    }, status=201)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_due_flashcards(request):
+    """
+    Next flashcards to review: ?limit=N (default 20, max 100) due cards, most
+    overdue first. Never-reviewed cards are due from their creation and are
+    left out with ?new=false.
+    """
+    try:
+        limit = min(max(int(request.query_params.get('limit', 20)), 1), 100)
+    except ValueError:
+        return Response({"error": "limit must be an integer"}, status=400)
+    include_new = request.query_params.get('new', 'true').lower() not in ('0', 'false', 'no')
+
+    queue = scheduler.due_cards(request.user, limit, include_new=include_new)
+    cards = [
+        {
+            "id": flashcard.id,
+            "note": flashcard.note_id,
+            "question": flashcard.question,
+            "answer": flashcard.answer,
+            "new": state.last_reviewed_at is None,
+            "due_at": state.due_at,
+            "interval_days": state.interval_days,
+            "ease": state.ease
+        }
+        for flashcard, state in queue
+    ]
+    return Response({"count": len(cards), "cards": cards})
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_quiz_stats(request, quiz_id):
+    return Response(stats.quiz_stats(request.user.id, [quiz_id])[0])
+
+def _id_list(request):
+    """Parse ?ids=1,2,3 (at most 200 ids)."""
+    raw = request.query_params.get('ids', '')
+    try:
+        ids = [int(part) for part in raw.split(',') if part.strip()]
+    except ValueError:
+        raise ValueError("ids must be a comma-separated list of integers")
+    if not ids:
+        raise ValueError("ids is required")
+    if len(ids) > 200:
+        raise ValueError("At most 200 ids per request")
+    return ids
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_quiz_stats_batch(request):
+    """Stats for many quizzes at once: ?ids=1,2,3."""
+    try:
+        quiz_ids = _id_list(request)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+    return Response({"stats": stats.quiz_stats(request.user.id, quiz_ids)})
+
+class ExportErrorRenderer(BaseRenderer):
+    """
+    Base for the export formats. Exports are streamed without it, so it only
+    renders errors DRF raises itself (authentication, throttling), as JSON.
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        response = (renderer_context or {}).get('response')
+        if response is not None:
+            response['Content-Type'] = 'application/json'
+        return json.dumps(data, cls=DjangoJSONEncoder).encode()
+
+class CSVRenderer(ExportErrorRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+class JSONLinesRenderer(ExportErrorRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'jsonl'
+
+def _export_attempts(request, kind):
+    """
+    Stream attempts as CSV (?format=csv, the default) or JSON Lines
+    (?format=jsonl), oldest id first. Exports the caller's own attempts, or
+    with ?group=<id> every member's attempts on the quizzes or flashcards
+    shared with that group (group creator and admins only).
+    ?since / ?until bound the attempt time; ?after_id resumes an
+    interrupted export after the last id received.
+    """
+    params = request.query_params
+    try:
+        since = export.parse_time(params['since']) if params.get('since') else None
+        until = export.parse_time(params['until']) if params.get('until') else None
+        after_id = int(params['after_id']) if params.get('after_id') else None
+        group_id = int(params['group']) if params.get('group') else None
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    user_ids, item_ids = [request.user.id], None
+    if group_id is not None:
+        try:
+            group = StudyGroup.objects.get(id=group_id)
+        except StudyGroup.DoesNotExist:
+            return JsonResponse({"error": "Group not found"}, status=404)
+        if group.created_by_id != request.user.id and not GroupMembership.objects.filter(user=request.user, group=group, role='admin').exists():
+            return JsonResponse({"error": "Only the group creator or an admin can export member attempts"}, status=403)
+        user_ids = GroupMembership.objects.filter(group=group).values('user_id')
+        item_ids = export.shared_with_group(kind, group.id)
+
+    fmt = request.accepted_renderer.format
+    queryset = export.attempts(kind, user_ids, since=since, until=until, after_id=after_id, item_ids=item_ids)
+    # A resumed CSV export continues the client's file, so it gets no second header.
+    response = StreamingHttpResponse(export.stream(kind, fmt, queryset, header=after_id is None), content_type=request.accepted_renderer.media_type)
+    response['Content-Disposition'] = f'attachment; filename="{kind}_attempts.{fmt}"'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([CSVRenderer, JSONLinesRenderer])
+def export_quiz_attempts(request):
+    return _export_attempts(request, 'quiz')
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([CSVRenderer, JSONLinesRenderer])
+def export_flashcard_attempts(request):
+    return _export_attempts(request, 'flashcard')
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_quiz_item_analysis(request, quiz_id):
+    """Per-question difficulty, discrimination and option choice counts across all attempts (quiz owner only)."""
+    try:
+        quiz = Quiz.objects.get(id=quiz_id, note__notebook__user=request.user)
+    except Quiz.DoesNotExist:
+        return Response({"error": "Quiz not found"}, status=404)
+    # Imported here so NumPy is only loaded by the workers that serve this report.
+    from .item_analysis import quiz_item_analysis
+    return Response(quiz_item_analysis(quiz))
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_flashcard_stats(request, flashcard_id):
-    user = request.user
-    attempts = FlashcardAttempt.objects.filter(user=user, flashcard_id=flashcard_id)
-    total_attempts = attempts.count()
-    set_attempts = total_attempts // 5
-    correct_count = attempts.filter(correct=True).count()
-    last_reviewed = attempts.order_by('-reviewed_at').first().reviewed_at if total_attempts > 0 else None
-    accuracy = (correct_count / total_attempts) * 100 if total_attempts > 0 else 0
-    return Response({
-        "flashcard_id": flashcard_id,
-        "attempts": total_attempts,
-        "set_attempts": set_attempts,
-        "correct": correct_count,
-        "accuracy": accuracy,
-        "last_reviewed": last_reviewed
-    })
+    return Response(stats.flashcard_stats(request.user.id, [flashcard_id])[0])
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_flashcard_stats_batch(request):
+    """Stats for many flashcards at once: ?ids=1,2,3."""
+    try:
+        flashcard_ids = _id_list(request)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+    return Response({"stats": stats.flashcard_stats(request.user.id, flashcard_ids)})
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_user_progress(request):
-    user = request.user
-    quiz_attempts = QuizAttempt.objects.filter(user=user)
-    flashcard_attempts = FlashcardAttempt.objects.filter(user=user)
-    total_quiz_attempts = quiz_attempts.count()
-    total_flashcard_attempts = flashcard_attempts.count()
-    flashcard_set_attempts = total_flashcard_attempts // 5
-    avg_quiz_score = quiz_attempts.aggregate(avg=Avg('score'))['avg'] or 0
-    correct_flashcards = flashcard_attempts.filter(correct=True).count()
-    flashcard_accuracy = (correct_flashcards / total_flashcard_attempts) * 100 if total_flashcard_attempts > 0 else 0
-    # Streaks (simple: count unique days with activity)
-    days = quiz_attempts.values_list('attempted_at', flat=True).union(
-        flashcard_attempts.values_list('reviewed_at', flat=True)
-    )
-    unique_days = set(dt.date() for dt in days)
-    current_streak = len(unique_days)
+    # Totals and streaks are maintained incrementally as attempts are saved (core.progress, core.streaks).
+    totals = UserProgress.objects.filter(user=request.user).first() or UserProgress(user=request.user)
+    user_stats = UserStats.objects.filter(user=request.user).first()
     return Response({
-        "total_quiz_attempts": total_quiz_attempts,
-        "total_flashcard_attempts": total_flashcard_attempts,
-        "flashcard_set_attempts": flashcard_set_attempts,
-        "average_quiz_score": avg_quiz_score,
-        "flashcard_accuracy": flashcard_accuracy,
-        "current_streak_days": current_streak
+        "total_quiz_attempts": totals.quiz_attempts,
+        "total_flashcard_attempts": totals.flashcard_attempts,
+        "flashcard_set_attempts": totals.flashcard_attempts // 5,
+        "average_quiz_score": totals.quiz_score_sum / totals.quiz_attempts if totals.quiz_attempts else 0,
+        "flashcard_accuracy": (totals.flashcard_correct / totals.flashcard_attempts) * 100 if totals.flashcard_attempts else 0,
+        "current_streak_days": streaks.current_streak(user_stats, streaks.user_timezone(request.user)),
+        "longest_streak_days": user_stats.longest_streak if user_stats else 0,
+        "active_days": totals.active_days
     })
 
+def _leaderboard_params(request):
+    """Parse ?period=all|week|month, ?ago=N (previous periods) and ?limit=N."""
+    period = request.query_params.get('period', 'all')
+    if period not in ('all',) + rollups.PERIODS:
+        raise ValueError("period must be one of: all, week, month")
+    try:
+        limit = min(max(int(request.query_params.get('limit', 10)), 1), 100)
+        ago = max(int(request.query_params.get('ago', 0)), 0)
+    except ValueError:
+        raise ValueError("limit and ago must be integers")
+    return period, limit, ago
+
+def _period_leaderboard(request, period, limit, ago, user_ids=None):
+    start = rollups.current_start(period, ago)
+    entries = []
+    for position, row in enumerate(rollups.standings(period, start, limit, user_ids), start=1):
+        # Same entry shape as the all-time board; here the total is for the period.
+        rank = entries[-1]['rank'] if entries and entries[-1]['total_points'] == row.points else position
+        entries.append({'user_id': row.user_id, 'username': row.user.username, 'total_points': row.points, 'rank': rank})
+    user_points, user_rank = rollups.points_and_rank(request.user, period, start, user_ids)
+    return {
+        'period': period,
+        'period_start': start,
+        'leaderboard': entries,
+        'user_rank': user_rank,
+        'user_points': user_points
+    }
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_leaderboard(request):
-    top_stats = UserStats.objects.select_related('user').order_by('-total_points')[:10]
-    leaderboard = [
-        {
-            'user_id': stat.user.id,
-            'username': stat.user.username,
-            'total_points': stat.total_points
-        }
-        for stat in top_stats
-    ]
-    # Optionally, include the requesting user's rank
-    user_stat = UserStats.objects.filter(user=request.user).first()
-    user_rank = None
-    if user_stat:
-        user_rank = UserStats.objects.filter(total_points__gt=user_stat.total_points).count() + 1
-    return Response({
-        'leaderboard': leaderboard,
-        'user_rank': user_rank,
+    """
+    All-time by default: top ?limit=N users (default 10, max 100), the
+    caller's rank and, with ?around=K (max 25), the K users either side of
+    the caller. ?period=week|month (with ?ago=N for earlier periods) ranks
+    points earned in that period instead.
+    """
+    try:
+        period, limit, ago = _leaderboard_params(request)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+    try:
+        window = min(max(int(request.query_params.get('around', 0)), 0), 25)
+    except ValueError:
+        return Response({"error": "around must be an integer"}, status=400)
+
+    if period != 'all':
+        return Response(_period_leaderboard(request, period, limit, ago))
+
+    user_stat = UserStats.objects.select_related('user').filter(user=request.user).first()
+    data = {
+        'leaderboard': leaderboard.top(limit),
+        'user_rank': leaderboard.rank_of(user_stat.total_points) if user_stat else None,
         'user_points': user_stat.total_points if user_stat else 0
-    })
+    }
+    if window and user_stat:
+        data['around_me'] = leaderboard.around(user_stat, window)
+    return Response(data)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_group_leaderboard(request, group_id):
+    """Leaderboard restricted to a group's members; same ?period, ?ago and ?limit as get_leaderboard."""
+    try:
+        group = StudyGroup.objects.get(id=group_id)
+    except StudyGroup.DoesNotExist:
+        return Response({"error": "Group not found"}, status=404)
+    if not GroupMembership.objects.filter(user=request.user, group=group).exists():
+        return Response({"error": "Access denied"}, status=403)
+    try:
+        period, limit, ago = _leaderboard_params(request)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+
+    member_ids = GroupMembership.objects.filter(group=group).values('user_id')
+    if period != 'all':
+        data = _period_leaderboard(request, period, limit, ago, member_ids)
+    else:
+        member_stats = UserStats.objects.select_related('user').filter(user_id__in=member_ids).order_by('-total_points', 'user_id')[:limit]
+        entries = []
+        for position, stat in enumerate(member_stats, start=1):
+            rank = entries[-1]['rank'] if entries and entries[-1]['total_points'] == stat.total_points else position
+            entries.append({'user_id': stat.user_id, 'username': stat.user.username, 'total_points': stat.total_points, 'rank': rank})
+        user_stat = UserStats.objects.filter(user=request.user).first()
+        user_points = user_stat.total_points if user_stat else 0
+        data = {
+            'period': period,
+            'leaderboard': entries,
+            'user_rank': UserStats.objects.filter(user_id__in=member_ids, total_points__gt=user_points).count() + 1 if user_stat else None,
+            'user_points': user_points
+        }
+    data['group_id'] = group.id
+    return Response(data)
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
@@ -1318,4 +1644,28 @@ def get_user_points(request):
     if not user_stat:
         return Response({'total_points': 0, 'breakdown': {}})
     # For now, just return total points; breakdown can be expanded later
-    return Response({'total_points': user_stat.total_points, 'breakdown': {}})
\ No newline at end of file
+    return Response({'total_points': user_stat.total_points, 'breakdown': {}})
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def get_ai_cache_stats(request):
+    return Response(get_generation_cache().stats())
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_generation_job(request, job_id):
+    try:
+        job = GenerationJob.objects.get(id=job_id, user=request.user)
+    except GenerationJob.DoesNotExist:
+        return Response({"error": "Job not found"}, status=404)
+    return Response(jobs.serialize_job(job))
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def get_ai_limiter_state(request):
+    user_id = request.query_params.get('user_id')
+    try:
+        user_id = int(user_id) if user_id else None
+    except ValueError:
+        return Response({"error": "user_id must be an integer"}, status=400)
+    return Response(ratelimit.snapshot(user_id))
@@ -10,6 +10,60 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 AUTH_USER_MODEL = 'core.User'
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+
+# LLM used for generation. BACKEND is 'gemini' or 'fake' (local, deterministic;
+# replays responses from REPLAY_FILE when given) for offline benchmarking.
+LLM_BACKEND = {
+    'BACKEND': os.getenv('LLM_BACKEND', 'gemini'),
+    'MODEL': os.getenv('LLM_MODEL', 'gemini-2.0-flash'),
+    'REPLAY_FILE': os.getenv('LLM_REPLAY_FILE') or None,
+    'LATENCY': float(os.getenv('LLM_FAKE_LATENCY', '0')),
+}
+
+# Cache for AI generation results. BACKEND is 'lru' (per-process) or
+# 'django' (shared, uses the Django cache named by ALIAS).
+AI_CACHE = {
+    'BACKEND': os.getenv('AI_CACHE_BACKEND', 'lru'),
+    'ALIAS': 'default',
+    'MAX_ENTRIES': int(os.getenv('AI_CACHE_MAX_ENTRIES', '256')),
+    'TIMEOUT': int(os.getenv('AI_CACHE_TIMEOUT', '86400')),
+}
+
+# Limits applied before every LLM call. Buckets refill continuously; the
+# circuit breaker opens for BREAKER_COOLDOWN seconds after BREAKER_THRESHOLD
+# consecutive upstream failures. CACHE must be shared by all workers.
+AI_RATE_LIMIT = {
+    'CACHE': 'ratelimit',
+    'GLOBAL_CAPACITY': int(os.getenv('AI_GLOBAL_CAPACITY', '15')),
+    'GLOBAL_REFILL_PER_MINUTE': float(os.getenv('AI_GLOBAL_PER_MINUTE', '15')),
+    'USER_CAPACITY': int(os.getenv('AI_USER_CAPACITY', '5')),
+    'USER_REFILL_PER_MINUTE': float(os.getenv('AI_USER_PER_MINUTE', '5')),
+    'BREAKER_THRESHOLD': int(os.getenv('AI_BREAKER_THRESHOLD', '5')),
+    'BREAKER_COOLDOWN': int(os.getenv('AI_BREAKER_COOLDOWN', '60')),
+    # Requests fail fast; background jobs wait this long for capacity instead.
+    # Generation needing more than USER_CAPACITY calls is run as a job.
+    'JOB_MAX_WAIT': int(os.getenv('AI_JOB_MAX_WAIT', '900')),
+}
+
+# Concurrent identical generation requests share one in-flight call; the
+# result is kept for RESULT_TTL seconds for retries. CACHE must be shared.
+GENERATION_SINGLEFLIGHT = {
+    'CACHE': 'shared',
+    'LOCK_TIMEOUT': 120,
+    'RESULT_TTL': 10,
+    'POLL_INTERVAL': 0.2,
+}
+
+# Threads used by `manage.py run_generation_worker`.
+GENERATION_WORKER_THREADS = int(os.getenv('GENERATION_WORKER_THREADS', '4'))
+
+# Upper bound on concurrent Gemini calls made by one bulk generation.
+GENERATION_MAX_WORKERS = int(os.getenv('GENERATION_MAX_WORKERS', '4'))
+
+# Notes longer than this (estimated tokens) are split into chunks that are
+# generated from in parallel and merged; at most GENERATION_MAX_CHUNKS are used.
+GENERATION_CHUNK_TOKENS = int(os.getenv('GENERATION_CHUNK_TOKENS', '6000'))
+GENERATION_MAX_CHUNKS = int(os.getenv('GENERATION_MAX_CHUNKS', '8'))
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
 
@@ -127,6 +181,47 @@ if 'DATABASE_URL' in os.environ:
     }
 
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Visible to every gunicorn worker; create the table with
+    # `python manage.py createcachetable`.
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'studypal_cache',
+    },
+    # AI rate limiter state (core.ratelimit), kept apart so culling other
+    # entries can never evict the global bucket or the circuit breaker.
+    # Idle user buckets expire once they would have refilled.
+    'ratelimit': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'studypal_ratelimit',
+        'OPTIONS': {'MAX_ENTRIES': 1000000},
+    },
+}
+
+# Weekly/monthly rollups kept for period leaderboards (core.rollups); CACHE
+# holds the once-per-period pruning flag and must be shared by all workers.
+# BUCKET_SIZE/BUCKETS shape the rank index (core.leaderboard); run
+# rebuild_leaderboard after changing them.
+LEADERBOARD = {
+    'CACHE': 'shared',
+    'BUCKET_SIZE': 10,
+    'BUCKETS': 4096,
+    'ROLLUP_RETENTION': {'week': 8, 'month': 12},
+}
+
+# Buffered ActivityLog writes (core.activity): flushed by a background thread
+# every FLUSH_INTERVAL seconds or once FLUSH_SIZE events are waiting.
+ACTIVITY_LOG = {
+    'ENABLED': os.getenv('ACTIVITY_LOG_ENABLED', 'True') == 'True',
+    'FLUSH_SIZE': int(os.getenv('ACTIVITY_LOG_FLUSH_SIZE', '200')),
+    'FLUSH_INTERVAL': float(os.getenv('ACTIVITY_LOG_FLUSH_INTERVAL', '5')),
+    'MAX_BUFFER': 10000,
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 